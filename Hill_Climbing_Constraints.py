@@ -4,8 +4,29 @@
 # Code de Philippe Schoeb et Nathan Bussière
 
 from aima3.search import *
+from local_search import UnitCounts, grid_of
 import time
 
+# Même fonction que hill_climbing de aima3, mais chaque voisin est évalué par la
+# variation de score de l'échange (UnitCounts) au lieu de recalculer value
+def hill_climbing(problem):
+    """From the initial node, keep choosing the neighbor with highest value,
+    stopping when no neighbor is better. [Figure 4.2]"""
+    current = Node(problem.initial)
+    counts = UnitCounts(grid_of(current.state))
+    while True:
+        actions = problem.actions(current.state)
+        if not actions:
+            break
+        deltas = [counts.delta(current.state, action) for action in actions]
+        best = max(deltas)
+        if best <= 0:
+            break
+        action = random.choice([a for a, delta in zip(actions, deltas) if delta == best])
+        counts.apply(current.state, action)
+        current = current.child_node(problem, action)
+    return current.state
+
 def cross(A, B):
     "Cross product of elements in A and elements in B."
     return [a+b for a in A for b in B]
@@ -4,6 +4,7 @@
 # Code de Philippe Schoeb et Nathan Bussière
 
 from aima3.search import *
+from local_search import UnitCounts, grid_of
 import time
 
 # On a modifié la fonction hill climbing pour qu'elle fonctionne comme voulu
@@ -11,19 +12,22 @@ def hill_climbing(problem):
     """From the initial node, keep choosing the neighbor with highest value,
     stopping when no neighbor is better. [Figure 4.2]"""
     current = Node(problem.initial)
+    counts = UnitCounts(grid_of(current.state))  # score of a neighbor = score + delta
     step = 0
     while True:
         step += 1
-        neighbors = current.expand(problem)
-        if not neighbors:
+        actions = problem.actions(current.state)
+        if not actions:
             break
-        neighbor = argmax_random_tie(neighbors,
-                                     key=lambda node: problem.value(node.state))
-        if problem.value(neighbor.state) < problem.value(current.state):
+        deltas = [counts.delta(current.state, action) for action in actions]
+        best = max(deltas)
+        if best < 0:
             break
         if step >= 200:
             break
-        current = neighbor
+        action = random.choice([a for a, delta in zip(actions, deltas) if delta == best])
+        counts.apply(current.state, action)
+        current = current.child_node(problem, action)
     return current.state
 
 def cross(A, B):
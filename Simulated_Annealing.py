@@ -4,29 +4,22 @@
 # Code de Philippe Schoeb et Nathan Bussière
 
 from aima3.search import *
+from local_search import SCHEDULES, Geometric, anneal, compact, uncompact
 import time
 
 # Schedule function
 def sched(alpha=0.99):
-    return lambda t: alpha*t if t > 1 * 10**(-20) else 0
+    return Geometric(alpha, 1 * 10**(-20))
 
-# On a modifié cette fonction pour qu'elle fonctionne comme nous voulons
-def simulated_annealing(problem, schedule=exp_schedule()):
+# On a modifié cette fonction pour qu'elle fonctionne comme nous voulons : l'état est
+# compacté en bytearray et chaque itération tire un seul échange au hasard (voir local_search)
+def simulated_annealing(problem, schedule=None, reheat_after=None):
     """[Figure 4.5] CAUTION: This differs from the pseudocode as it
-    returns a state instead of a Node."""
-    current = Node(problem.initial)
-    T = 3  # initial temperature
-    while True:
-        T = schedule(T)
-        if T == 0:
-            return current.state
-        neighbors = current.expand(problem)
-        if not neighbors:
-            return current.state
-        next = random.choice(neighbors)
-        delta_e = problem.value(next.state) - problem.value(current.state)
-        if delta_e > 0 or probability(math.exp(delta_e / T)):
-            current = next
+    returns a state instead of a Node. schedule is a local_search schedule
+    (sched() by default); see anneal for reheat_after."""
+    grid, moves = compact(problem.initial)
+    anneal(grid, moves, schedule or sched(), T=3, reheat_after=reheat_after)  # initial temperature 3
+    return uncompact(grid, problem.initial)
 
 def cross(A, B):
     "Cross product of elements in A and elements in B."
@@ -207,10 +200,11 @@ def solved(solution):
     b2 = all(unitsolved(unit) for unit in unitlist)
     return b1 and b2
 
-def solve_all(grids, name='', showif=0.0):
+def solve_all(grids, name='', showif=0.0, schedule='geometric', reheat_after=None):
     """Attempt to solve a sequence of grids. Report results.
     When showif is a number of seconds, display puzzles that take longer.
-    When showif is None, don't display any puzzles."""
+    When showif is None, don't display any puzzles.
+    schedule is a key of local_search.SCHEDULES; reheat_after is passed to anneal."""
     def solve_single(grid):
         start = time.time()
         values = solve(grid)
@@ -223,7 +217,7 @@ def solve_all(grids, name='', showif=0.0):
         values = complete(values)
         sudoku = Sudoku(values)
         initial_score = sudoku.value(values)
-        solution = simulated_annealing(sudoku, sched())
+        solution = simulated_annealing(sudoku, SCHEDULES[schedule](), reheat_after)
         t = time.time()-start
         final_score = sudoku.value(solution)
         print("Using Simulated Annealing, went from %d to %d" % (initial_score, final_score))
@@ -0,0 +1,174 @@
+# Voici le fichier contenant le code pour :
+# le banc d'essai commun à tous les solveurs (Norvig et ses variantes, bitmask,
+# dancing links, Hill Climbing, Hill Searching, Simulated Annealing) sur
+# top95.txt, 100sudoku.txt et 1000sudoku.txt, avec sortie JSON pour comparer
+# les résultats d'un commit à l'autre
+
+# Code de Philippe Schoeb et Nathan Bussière
+
+import argparse
+import importlib
+import json
+import platform
+import random
+import subprocess
+import time
+
+import sudoku_norvig
+from sudoku_norvig import parse_grid, read_grids, SearchStats
+
+## A benchmark solver is called with a grid and returns (solved, nodes), nodes
+## being the number of search nodes expanded, or None when the solver does not
+## count them. Its reset attribute, when not None, is called (untimed) before
+## each run, e.g. to empty a cache that would make the repeated runs trivial.
+
+CORPORA = {'hard': 'top95.txt', 'sudokus': '100sudoku.txt', 'sudokus1000': '1000sudoku.txt'}
+
+def norvig(search):
+    "Benchmark solver for search, one of the sudoku_norvig searches taking a stats argument."
+    def solve(grid):
+        stats = SearchStats()
+        return sudoku_norvig.solved(search(parse_grid(grid), stats=stats)), stats.nodes
+    solve.reset = None
+    return solve
+
+def plain(module, solve_name, reset=None):
+    "Benchmark solver for module.solve_name(grid), which returns values or False."
+    def solve(grid):
+        m = importlib.import_module(module)
+        return sudoku_norvig.solved(getattr(m, solve_name)(grid)), None
+    solve.reset = reset
+    return solve
+
+def local(module, search_name):
+    """Benchmark solver for a local-search module (imported on first use, since
+    they need aima3): propagate, fill the grid at random, then run the search."""
+    def solve(grid):
+        m = importlib.import_module(module)
+        values = m.solve(grid)
+        if not m.solved(values):
+            values = getattr(m, search_name)(m.Sudoku(m.complete(values)))
+        return m.solved(values), None
+    solve.reset = None
+    return solve
+
+SOLVERS = {
+    'norvig': norvig(sudoku_norvig.norvig_search),
+    'random': norvig(sudoku_norvig.random_search),
+    'restarts': norvig(sudoku_norvig.random_search_restarts),
+    'subsets': norvig(sudoku_norvig.norvig_search_heuristic),
+    'locked': norvig(sudoku_norvig.norvig_search_opti),
+    'strategies': norvig(sudoku_norvig.norvig_search_strategies),
+    'trail': norvig(sudoku_norvig.norvig_search_trail),
+    'dlx': plain('sudoku_norvig', 'solve_dlx'),
+    'cached': plain('sudoku_norvig', 'solve_cached', sudoku_norvig.canonical_cache.clear),
+    'bitmask': plain('sudoku_bitmask', 'solve_norvig'),
+    'hill_climbing': local('Hill_Climbing', 'hill_climbing'),
+    'hill_climbing_constraints': local('Hill_Climbing_Constraints', 'hill_climbing'),
+    'hill_searching': local('Hill_Searching', 'hill_climbing'),
+    'hill_searching_constraints': local('Hill_Searching_Constraints', 'hill_climbing'),
+    'annealing': local('Simulated_Annealing', 'simulated_annealing'),
+    'annealing_constraints': local('Simulated_Annealing_Constraints', 'simulated_annealing'),
+}
+
+def percentile(times, p):
+    "The p-th percentile (0 <= p <= 100) of the sorted list times, interpolated."
+    k = (len(times) - 1) * p / 100
+    i = int(k)
+    if i + 1 >= len(times):
+        return times[-1]
+    return times[i] + (times[i + 1] - times[i]) * (k - i)
+
+def benchmark(solve, grids, repeats=3, warmup=5):
+    """Time solve on each of grids: warmup grids are solved first and not
+    counted, then every grid is solved repeats times and its time is the
+    median of those runs (measured with perf_counter). solve.reset, if any, is
+    called before every run. Return a dict of results."""
+    for grid in grids[:warmup]:
+        if solve.reset is not None:
+            solve.reset()
+        solve(grid)
+    times, nsolved, nodes = [], 0, []
+    for grid in grids:
+        runs = []
+        for r in range(repeats):
+            if solve.reset is not None:
+                solve.reset()
+            start = time.perf_counter()
+            ok, n = solve(grid)
+            runs.append(time.perf_counter() - start)
+        runs.sort()
+        times.append(runs[len(runs) // 2])
+        nsolved += bool(ok)  # Only the last run is checked
+        if n is not None:
+            nodes.append(n)
+    N = len(grids)
+    total = sum(times)
+    times.sort()
+    return {
+        'puzzles': N,
+        'solved': nsolved,
+        'solve_rate': nsolved / N,
+        'mean': total / N,
+        'p50': percentile(times, 50),
+        'p95': percentile(times, 95),
+        'p99': percentile(times, 99),
+        'max': times[-1],
+        'total': total,
+        'nodes': sum(nodes) if nodes else None,
+        'mean_nodes': sum(nodes) / len(nodes) if nodes else None,
+    }
+
+def commit():
+    "Current git commit, or None outside of a git checkout."
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(solvers, corpora, repeats=3, warmup=5, limit=None, seed=0):
+    """Benchmark each solver on each corpus (names in SOLVERS and CORPORA); only
+    the first limit grids of each corpus when limit is given. Print a line per
+    run and return all the results, ready to be dumped as JSON."""
+    report = {'commit': commit(), 'python': platform.python_version(),
+              'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'repeats': repeats,
+              'warmup': warmup, 'seed': seed, 'results': {}}
+    for corpus in corpora:
+        grids = list(read_grids(CORPORA[corpus]))[:limit]
+        for name in solvers:
+            random.seed(seed)
+            r = benchmark(SOLVERS[name], grids, repeats, warmup)
+            report['results']['%s/%s' % (name, corpus)] = r
+            print("%-28s %-12s solved %4d of %4d  p50 %.6f  p95 %.6f  p99 %.6f  max %.6f secs%s" % (
+                name, corpus, r['solved'], r['puzzles'], r['p50'], r['p95'], r['p99'], r['max'],
+                '' if r['nodes'] is None else '  %.1f nodes' % r['mean_nodes']))
+    return report
+
+def compare(old, new):
+    """Print, for each run present in both reports (dicts loaded from the JSON
+    files), the ratio new/old of its p50, p95 and p99 and the solve rates."""
+    for key in sorted(set(old['results']) & set(new['results'])):
+        a, b = old['results'][key], new['results'][key]
+        ratios = '  '.join('%s x%.2f' % (p, b[p] / a[p]) if a[p] else '%s -' % p for p in ('p50', 'p95', 'p99'))
+        print("%-41s %s  solve rate %.3f -> %.3f" % (key, ratios, a['solve_rate'], b['solve_rate']))
+
+if __name__ == '__main__':
+    # python benchmark.py -s norvig dlx -c hard -o new.json --compare old.json
+    parser = argparse.ArgumentParser(description="Benchmark sudoku solvers.")
+    parser.add_argument('-s', '--solvers', nargs='+', default=['norvig'], choices=sorted(SOLVERS))
+    parser.add_argument('-c', '--corpora', nargs='+', default=sorted(CORPORA), choices=sorted(CORPORA))
+    parser.add_argument('-r', '--repeats', type=int, default=3)
+    parser.add_argument('-w', '--warmup', type=int, default=5)
+    parser.add_argument('-n', '--limit', type=int, default=None, help="only the first n grids of each corpus")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+    report = run(args.solvers, args.corpora, args.repeats, args.warmup, args.limit, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
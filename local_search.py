@@ -0,0 +1,330 @@
+# Voici le fichier contenant le code commun aux recherches locales
+# (Hill_Climbing, Hill_Searching, Simulated_Annealing et leurs versions avec contraintes) :
+# évaluation incrémentale des échanges, état compact, recuit et redémarrages
+
+# Code de Philippe Schoeb et Nathan Bussière
+
+import math
+import multiprocessing
+import os
+import random
+
+## The states are the {square: (digit, editable)} dicts of the local-search modules.
+## The value of a state is minus the number of digits missing from its rows,
+## columns and 3x3 squares, exactly like Sudoku.value.
+
+def cross(A, B):
+    "Cross product of elements in A and elements in B."
+    return [a+b for a in A for b in B]
+
+digits = '123456789'
+rows = 'ABCDEFGHI'
+cols = digits
+squares = cross(rows, cols)
+
+################ Unit Tests ################
+
+def test():
+    "A set of tests that must pass (the Sudoku problem comes from Simulated_Annealing, which needs aima3)."
+    import Simulated_Annealing
+    random.seed(0)
+    state = Simulated_Annealing.complete(Simulated_Annealing.solve(Simulated_Annealing.hard1))
+    problem = Simulated_Annealing.Sudoku(state)
+    counts = UnitCounts(grid_of(state))
+    assert counts.value() == problem.value(state)
+    actions = problem.actions(state)
+    assert actions
+    for action in actions:
+        assert counts.delta(state, action) == problem.value(problem.result(state, action)) - problem.value(state)
+    ## Every schedule stops by itself, even when no move is ever accepted
+    for schedule in SCHEDULES.values():
+        schedule = schedule()
+        T, k = schedule.start(3), 0
+        while T > 0:
+            schedule.record(False)
+            T, k = schedule(T), k + 1
+            assert k < 10**6
+    ## With reheats, the grid is still left at the best state met
+    grid, moves = compact(state)
+    best = anneal(grid, moves, Geometric(0.9), reheat_after=50, reheats=3)
+    assert UnitCounts(grid).value() == best >= counts.value()
+    print('All tests pass.')
+
+################ Delta evaluation of swaps ################
+
+## Cells are numbered 0..80 in squares order
+position = dict((s, i) for i, s in enumerate(squares))
+ROW = [i // 9 for i in range(81)]
+COL = [i % 9 for i in range(81)]
+
+def grid_of(state):
+    "List of the 81 digits (ints) of a state, in squares order."
+    return [int(state[s][0]) for s in squares]
+
+class UnitCounts:
+    """Number of times each digit appears in each row and each column of a grid.
+    A swap inside a 3x3 square leaves the squares unchanged and touches at most
+    two rows and two columns, so its effect on the value is computed in O(1)."""
+
+    def __init__(self, grid):
+        self.rows = [[0] * 10 for r in range(9)]
+        self.cols = [[0] * 10 for c in range(9)]
+        for i, d in enumerate(grid):
+            self.rows[ROW[i]][d] += 1
+            self.cols[COL[i]][d] += 1
+
+    def swap_delta(self, i, j, x, y):
+        "Change of value if cell i (holding x) and cell j (holding y != x) are swapped."
+        delta = 0
+        if ROW[i] != ROW[j]:
+            ri, rj = self.rows[ROW[i]], self.rows[ROW[j]]
+            delta += (ri[y] == 0) - (ri[x] == 1) + (rj[x] == 0) - (rj[y] == 1)
+        if COL[i] != COL[j]:
+            ci, cj = self.cols[COL[i]], self.cols[COL[j]]
+            delta += (ci[y] == 0) - (ci[x] == 1) + (cj[x] == 0) - (cj[y] == 1)
+        return delta
+
+    def swap(self, i, j, x, y):
+        "Update the counts after cell i (holding x) and cell j (holding y) are swapped."
+        for line, a, b in ((self.rows, ROW[i], ROW[j]), (self.cols, COL[i], COL[j])):
+            line[a][x] -= 1
+            line[a][y] += 1
+            line[b][y] -= 1
+            line[b][x] += 1
+
+    def value(self):
+        "Value of the grid (minus the digits missing from its rows and columns)."
+        return -sum(line[1:].count(0) for line in self.rows + self.cols)
+
+    def delta(self, state, action):
+        "Change of value caused by the swap action (a pair of squares) on state."
+        s1, s2 = action
+        return self.swap_delta(position[s1], position[s2], int(state[s1][0]), int(state[s2][0]))
+
+    def apply(self, state, action):
+        "Update the counts for the swap action done on state (before the swap)."
+        s1, s2 = action
+        self.swap(position[s1], position[s2], int(state[s1][0]), int(state[s2][0]))
+
+################ Compact state for simulated annealing ################
+
+def compact(state):
+    """Convert a state to (grid, moves): grid is a bytearray of the 81 digits and
+    moves the list of the (i, j) pairs of editable cells of a same 3x3 square,
+    i.e. every action of Sudoku.actions. The editable cells never change, so
+    moves is computed once for the whole annealing."""
+    grid = bytearray(grid_of(state))
+    moves = []
+    for rs in ('ABC', 'DEF', 'GHI'):
+        for cs in ('123', '456', '789'):
+            free = [position[s] for s in cross(rs, cs) if state[s][1]]
+            moves.extend((free[a], free[b]) for a in range(len(free)) for b in range(a+1, len(free)))
+    return grid, moves
+
+def uncompact(grid, state):
+    "The state with the digits of grid, keeping the editable flags of state."
+    return dict((s, (str(grid[i]), state[s][1])) for i, s in enumerate(squares))
+
+def swap(grid, i, j):
+    "Swap cells i and j of grid in place (doing it again undoes it)."
+    grid[i], grid[j] = grid[j], grid[i]
+
+################ Cooling schedules ################
+
+## A schedule is called with the current temperature and returns the next one
+## (0 stops the annealing). start(T) resets it at the beginning of a chain (or a
+## reheat) and returns the first temperature; record(accepted) is told, after
+## each move, whether the move was accepted. Schedules are classes so that they
+## can be sent to the worker processes of anneal_restarts.
+
+class Schedule:
+    "Base schedule: keep the temperature constant."
+
+    def start(self, T):
+        return T
+
+    def record(self, accepted):
+        pass
+
+    def __call__(self, T):
+        return T
+
+class Geometric(Schedule):
+    "Geometric cooling T -> alpha*T, then 0 (stop) once T is below Tmin."
+
+    def __init__(self, alpha=0.99, Tmin=1e-20):
+        self.alpha = alpha
+        self.Tmin = Tmin
+
+    def __call__(self, T):
+        return self.alpha*T if T > self.Tmin else 0
+
+class Linear(Schedule):
+    "Linear cooling T -> T - step, then 0 (stop)."
+
+    def __init__(self, step=1e-3):
+        self.step = step
+
+    def __call__(self, T):
+        return max(T - self.step, 0)
+
+class Logarithmic(Schedule):
+    "Logarithmic cooling T_k = T_0 / log(k + 2), stopped after steps moves."
+
+    def __init__(self, steps=20000):
+        self.steps = steps
+
+    def start(self, T):
+        self.T0 = T
+        self.k = 0
+        return T
+
+    def __call__(self, T):
+        self.k += 1
+        return self.T0 / math.log(self.k + 2) if self.k < self.steps else 0
+
+class Adaptive(Geometric):
+    """Geometric cooling whose factor follows the acceptance rate of the last
+    window moves: it cools at alpha**2 while more than target of the moves are
+    accepted, and at sqrt(alpha) below. It stops after patience windows in a row
+    without any accepted move, instead of going on at a useless temperature."""
+
+    def __init__(self, target=0.2, window=100, patience=5, alpha=0.99, Tmin=1e-20):
+        super().__init__(alpha, Tmin)
+        self.target = target
+        self.window = window
+        self.patience = patience
+
+    def start(self, T):
+        self.factor = self.alpha
+        self.moves = self.accepted = self.frozen = 0
+        return T
+
+    def record(self, accepted):
+        self.moves += 1
+        self.accepted += accepted
+        if self.moves == self.window:
+            rate = self.accepted / self.moves
+            self.factor = self.alpha**2 if rate > self.target else math.sqrt(self.alpha)
+            self.frozen = self.frozen + 1 if self.accepted == 0 else 0
+            self.moves = self.accepted = 0
+
+    def __call__(self, T):
+        if self.frozen >= self.patience:
+            return 0
+        return self.factor*T if T > self.Tmin else 0
+
+SCHEDULES = {'geometric': Geometric, 'linear': Linear, 'logarithmic': Logarithmic, 'adaptive': Adaptive}
+
+def anneal(grid, moves, schedule, T=3, stop=None, reheat_after=None, reheats=10):
+    """Simulated annealing on a compact grid, modified in place. Each iteration
+    samples a single random move and scores it with UnitCounts, so it costs O(1)
+    instead of expanding and copying every neighbor. Stops when the temperature
+    reaches 0, the grid is solved or the event stop is set.
+    When reheat_after is a number of moves, a chain whose best value has not
+    improved for that long is restarted from temperature T (at most reheats times).
+    The grid is left at the best state met; return its value."""
+    counts = UnitCounts(grid)
+    value = best = counts.value()
+    best_grid = bytes(grid)
+    T0 = T
+    T = schedule.start(T)
+    k = stall = 0
+    while value < 0 and moves:
+        T = schedule(T)
+        if T == 0:
+            break
+        k += 1
+        if stop is not None and k % 1024 == 0 and stop.is_set():
+            break
+        i, j = random.choice(moves)
+        x, y = grid[i], grid[j]
+        delta = counts.swap_delta(i, j, x, y)
+        accepted = delta > 0 or random.random() < math.exp(delta / T)
+        schedule.record(accepted)
+        if accepted:
+            counts.swap(i, j, x, y)
+            swap(grid, i, j)
+            value += delta
+            if value > best:
+                best, best_grid, stall = value, bytes(grid), 0
+                continue
+        stall += 1
+        if reheat_after is not None and stall >= reheat_after and reheats > 0:
+            T = schedule.start(T0)  # Reheat
+            reheats -= 1
+            stall = 0
+    grid[:] = best_grid
+    return best
+
+################ Multi-restart annealing ################
+
+stop_event = None  # Set in each worker process of anneal_restarts
+
+def init_chain(event):
+    global stop_event
+    stop_event = event
+
+def anneal_chain(chain, fill, values, schedule, seed, reheat_after=None):
+    """Chain number chain of anneal_restarts: fill values at random (with fill,
+    e.g. complete) using seed, then anneal. Return (chain, initial value, value, state)."""
+    random.seed(seed)
+    state = fill(dict(values))
+    grid, moves = compact(state)
+    initial = UnitCounts(grid).value()
+    value = anneal(grid, moves, schedule, stop=stop_event, reheat_after=reheat_after)
+    if value == 0 and stop_event is not None:
+        stop_event.set()  # Solved, tell the other chains to stop
+    return chain, initial, value, uncompact(grid, state)
+
+class ChainPool:
+    """Worker processes for the chains of anneal_restarts, with the event that
+    tells their chains to stop. Create one for a whole run of puzzles and pass
+    it to anneal_restarts, rather than starting processes for every puzzle.
+    workers processes (None means one per core, at most chains when given)."""
+
+    def __init__(self, workers=None, chains=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+            if chains is not None:
+                workers = min(chains, workers)
+        self.event = multiprocessing.Event()
+        self.pool = multiprocessing.Pool(workers, initializer=init_chain, initargs=(self.event,))
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def anneal_restarts(fill, values, schedule, chains=4, workers=None, seed=None, reheat_after=None, pool=None):
+    """Run chains independent annealing chains (different seeds) on pool, a
+    ChainPool, or on a new one of workers processes when pool is None. As soon
+    as one chain solves the grid the others are stopped. schedule must be
+    picklable (e.g. Geometric). Return (chain, initial value, value, state) of
+    the best chain."""
+    if pool is None:
+        with ChainPool(workers, chains) as pool:
+            return anneal_restarts(fill, values, schedule, chains, seed=seed, reheat_after=reheat_after, pool=pool)
+    rng = random.Random(seed)
+    tasks = [(k, fill, values, schedule, rng.randrange(2**32), reheat_after) for k in range(chains)]
+    pool.event.clear()
+    best = None
+    ## All the chains are collected, so that none is still running when the
+    ## event is cleared for the next puzzle; once it is set they stop quickly.
+    for chain, initial, value, state in pool.pool.imap_unordered(star_anneal_chain, tasks):
+        if best is None or value > best[2]:
+            best = (chain, initial, value, state)
+        if value == 0:
+            pool.event.set()
+    return best
+
+def star_anneal_chain(args):
+    return anneal_chain(*args)
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,122 @@
+# Voici le fichier contenant le code pour :
+# la propagation des contraintes sur un lot de grilles à la fois avec NumPy ;
+# seules les grilles non résolues par la propagation passent par norvig_search
+
+
+# Code de Philippe Schoeb et Nathan Bussière
+
+import itertools
+import time
+
+import numpy as np
+
+from sudoku_norvig import GAVE_UP, digits, squares, unitlist, make_budget, norvig_search, read_grids, solved
+
+## Throughout this program we have:
+##   cands is an (N, 81, 9) boolean array: cands[n, i, k] is True when digit k+1
+##   is still possible for square i (in squares order) of grid n
+
+index = dict((s, i) for i, s in enumerate(squares))
+
+## UNITS[u, i] is True when square i is in unit u; PEERS[i, j] when i != j share a unit
+UNITS = np.zeros((27, 81), dtype=np.float32)
+for u, unit in enumerate(unitlist):
+    UNITS[u, [index[s] for s in unit]] = 1
+PEERS = ((UNITS.T @ UNITS) > 0).astype(np.float32)
+np.fill_diagonal(PEERS, 0)
+
+def candidates(grids):
+    "Convert a list of grids ('.' or '0' for empties) to an (N, 81, 9) candidate array."
+    chars = ''.join(c for grid in grids for c in grid if c in digits or c in '0.')
+    assert len(chars) == 81*len(grids)
+    d = np.frombuffer(chars.replace('.', '0').encode(), dtype=np.uint8).reshape(-1, 81) - ord('0')
+    cands = np.ones(d.shape + (9,), dtype=bool)
+    given = d > 0
+    cands[given] = np.arange(1, 10) == d[given][:, None]
+    return cands
+
+def propagate(cands):
+    """Apply naked singles (a decided square removes its digit from its peers) and
+    hidden singles (a digit with one place left in a unit goes there) to every
+    grid at once, until nothing changes. Return (cands, ok): ok[n] is False when
+    grid n has a contradiction (its candidates are then all cleared)."""
+    cands = cands.copy()
+    while True:
+        fixed = cands & (cands.sum(axis=2) == 1)[..., None]
+        new = cands & ~(PEERS @ fixed.astype(np.float32) > 0)
+        once = (UNITS @ new.astype(np.float32)) == 1             # (N, unit, digit)
+        hidden = (UNITS.T @ once.astype(np.float32) > 0) & new   # (N, square, digit)
+        nhidden = hidden.sum(axis=2)
+        new = np.where((nhidden > 0)[..., None], hidden, new)
+        bad = ((new.sum(axis=2) == 0).any(axis=1) | (nhidden > 1).any(axis=1) |
+               ((UNITS @ new.astype(np.float32)) == 0).any(axis=(1, 2)))
+        new[bad] = False
+        if np.array_equal(new, cands):
+            return cands, ~bad
+        cands = new
+
+def values_of(cands):
+    "Convert the (81, 9) candidates of one grid to a {square: digits} dict."
+    return dict((s, ''.join(digits[k] for k in np.flatnonzero(cands[i])))
+                for i, s in enumerate(squares))
+
+def solve_batch(grids, timeout=None, max_nodes=None):
+    """Solve a list of grids: propagate them all at once, then finish the
+    unsolved ones with norvig_search, each within timeout seconds and max_nodes
+    nodes. Return (results, searched): results has one entry per grid, its
+    values dict, False (no solution) or GAVE_UP; searched is the number of
+    grids that needed a search."""
+    cands, ok = propagate(candidates(grids))
+    done = (cands.sum(axis=2) == 1).all(axis=1)
+    results = []
+    for n in range(len(grids)):
+        if not ok[n]:
+            results.append(False)
+        elif done[n]:
+            results.append(values_of(cands[n]))
+        else:
+            results.append(norvig_search(values_of(cands[n]), budget=make_budget(timeout, max_nodes)))
+    return results, int((ok & ~done).sum())
+
+################ System test ################
+
+def solve_all(grids, name='', batch=1024, timeout=None, max_nodes=None):
+    """Attempt to solve a sequence of grids, batch grids at a time. Report results.
+    timeout (seconds) and max_nodes bound the search on each grid; the grids
+    given up on are reported separately."""
+    grids = iter(grids)
+    N = nsolved = searched = gave_up = 0
+    start = time.time()
+    while True:
+        chunk = list(itertools.islice(grids, batch))
+        if not chunk:
+            break
+        results, n = solve_batch(chunk, timeout, max_nodes)
+        N += len(chunk)
+        nsolved += sum(map(solved, results))
+        searched += n
+        gave_up += sum(result is GAVE_UP for result in results)
+    t = time.time()-start
+    if N >= 1:
+        print("NUMPY BATCH PROPAGATION")
+        print("Solved %d of %d %s puzzles, %d of them needed a search (avg %.8f secs (%d Hz), total %.8f secs)." % (
+            nsolved, N, name, searched, t/N, N/t, t))
+        if timeout is not None or max_nodes is not None:
+            print("Gave up on %d of %d %s puzzles (timeout or node budget)." % (gave_up, N, name))
+
+def test():
+    "A set of tests that must pass."
+    from sudoku_norvig import grid1, grid2, parse_grid
+    assert PEERS.sum() == 81*20
+    results, n = solve_batch([grid1, grid2, '11' + '.'*79])
+    assert results[0] == parse_grid(grid1) and solved(results[1]) and results[2] is False
+    assert n == 1
+    from sudoku_norvig import hard1
+    results, n = solve_batch([grid1, hard1], max_nodes=1)
+    assert results[0] == parse_grid(grid1) and results[1] is GAVE_UP
+    print('All tests pass.')
+
+if __name__ == '__main__':
+    test()
+    solve_all(read_grids("1000sudoku.txt"), "sudokus")
+    solve_all(read_grids("top95.txt"), "hard")
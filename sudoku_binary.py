@@ -0,0 +1,206 @@
+# Voici le fichier contenant le code pour :
+# les grilles compactées (4 bits par case) et la table des solutions sur disque
+
+
+# Code de Philippe Schoeb et Nathan Bussière
+
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+## A grid is packed in 41 bytes: square k (in A1, A2, ..., I9 order) is the
+## high nibble of byte k//2 when k is even and the low nibble when k is odd;
+## 0 is an empty square and the last low nibble is unused.
+
+digits = '123456789'
+GRID_BYTES = 41
+
+def pack_grid(grid):
+    "Pack a grid ('.' or '0' for empties) into 41 bytes, 4 bits per square."
+    nibbles = [int(c) if c in digits else 0 for c in grid if c in digits or c in '0.']
+    assert len(nibbles) == 81
+    nibbles.append(0)
+    return bytes(nibbles[k] << 4 | nibbles[k+1] for k in range(0, 82, 2))
+
+def unpack_grid(data):
+    "Unpack 41 bytes into an 81-char grid with '.' for empties."
+    chars = []
+    for byte in data[:GRID_BYTES]:
+        chars.append(str(byte >> 4))
+        chars.append(str(byte & 15))
+    return ''.join(chars[:81]).replace('0', '.')
+
+################ Unit Tests ################
+
+def test():
+    "A set of tests that must pass."
+    solution = '483921657967345821251876493548132976729564138136798245372689514814253769695417382'
+    grid = '..3.2.6..9..3.5..1..18.64....81.29..7.......8..67.82....26.95..8..2.3..9..5.1.3..'
+    assert len(pack_grid(grid)) == GRID_BYTES and unpack_grid(pack_grid(grid)) == grid
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'store.bin')
+        ## 16 puzzles in 8 slots: the store grows to 16 slots, then to 32
+        puzzles = dict(('.'*i + solution[i] + '.'*(80-i), solution[i:] + solution[:i]) for i in range(16))
+        with SolutionStore(path, capacity=8) as store:
+            for puzzle, sol in puzzles.items():
+                store.put(puzzle, sol)
+            store.put(grid, solution)
+            store.put(grid, solution)
+            assert store.capacity == 32 and len(store) == 17
+        with SolutionStore(path) as store:
+            assert store.capacity == 32 and len(store) == 17
+            assert all(store.get(puzzle) == sol for puzzle, sol in puzzles.items())
+            assert store.get(grid) == solution and store.get('.'*81) is None
+        ## 5001 grids: more than one 4096-grid block of read_packed
+        path = os.path.join(tmp, 'puzzles.bin')
+        grids = [grid, solution, '.'*81] * 1667
+        assert write_packed(grids, path) == len(grids) and os.path.getsize(path) == len(grids)*GRID_BYTES
+        assert [unpack_grid(data) for data in read_packed(path)] == grids
+    print('All tests pass.')
+
+################ Solution store ################
+
+## The store is a file holding an open-addressing hash table: a header
+## (magic, capacity, count) followed by capacity records of 82 bytes, the
+## packed puzzle then its packed solution. A slot is free when its solution
+## starts with a zero byte (a solution has no empty square). Lookups read the
+## records straight from the mmap'ed file.
+
+MAGIC = b'SUDOKUS1'
+HEADER = struct.Struct('<8sQQ')
+RECORD = 2*GRID_BYTES
+
+class SolutionStore:
+    """Persistent map from puzzles (81-char grids, normally in canonical form)
+    to their solutions, in a fixed-width binary file opened with mmap."""
+
+    def __init__(self, path, capacity=1 << 16):
+        self.path = path
+        self.readonly = False
+        if not os.path.exists(path):
+            self.create(path, capacity)
+        self.open()
+
+    @staticmethod
+    def create(path, capacity):
+        "Write an empty store of capacity slots at path."
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, capacity, 0))
+            f.truncate(HEADER.size + capacity*RECORD)
+
+    def open(self):
+        self.file = open(self.path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.view = memoryview(self.map)
+        magic, self.capacity, self.count = HEADER.unpack_from(self.map)
+        assert magic == MAGIC, "%s is not a solution store" % self.path
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def slot(self, key):
+        "Offset of the record holding the packed puzzle key, or of the free slot where it goes."
+        i = zlib.crc32(key) % self.capacity
+        while True:
+            offset = HEADER.size + i*RECORD
+            if self.map[offset + GRID_BYTES] == 0 or self.view[offset:offset + GRID_BYTES] == key:
+                return offset
+            i = (i + 1) % self.capacity
+
+    def get(self, grid):
+        "Solution of grid as 81 digits, or None if it is not in the store."
+        offset = self.slot(pack_grid(grid))
+        if self.map[offset + GRID_BYTES] == 0:
+            return None
+        return unpack_grid(self.view[offset + GRID_BYTES:offset + RECORD])
+
+    def put(self, grid, solution):
+        "Add (or replace) the solution of grid."
+        if 10*(self.count + 1) > 7*self.capacity:
+            self.grow()
+        key = pack_grid(grid)
+        offset = self.slot(key)
+        if self.map[offset + GRID_BYTES] == 0:
+            self.count += 1
+            HEADER.pack_into(self.map, 0, MAGIC, self.capacity, self.count)
+        ## Solution first: the slot only looks used once it is complete
+        self.map[offset + GRID_BYTES:offset + RECORD] = pack_grid(solution)
+        self.map[offset:offset + GRID_BYTES] = key
+
+    def records(self):
+        "Generate the (packed puzzle, packed solution) pairs of the store."
+        for i in range(self.capacity):
+            offset = HEADER.size + i*RECORD
+            if self.map[offset + GRID_BYTES] != 0:
+                yield (self.map[offset:offset + GRID_BYTES],
+                       self.map[offset + GRID_BYTES:offset + RECORD])
+
+    def grow(self):
+        "Rehash the store into a file twice as large, replacing the old one."
+        tmp = self.path + '.tmp'
+        records = list(self.records())
+        self.close()
+        self.create(tmp, 2*self.capacity)
+        with SolutionStore(tmp) as bigger:
+            for key, solution in records:
+                offset = bigger.slot(key)
+                bigger.map[offset:offset + RECORD] = key + solution
+            bigger.count = len(records)
+            HEADER.pack_into(bigger.map, 0, MAGIC, bigger.capacity, bigger.count)
+            bigger.map.flush()
+        os.replace(tmp, self.path)
+        self.open()
+
+    def flush(self):
+        self.map.flush()
+
+################ Packed puzzle files ################
+
+## A packed puzzle file is just a sequence of 41-byte packed grids, half the
+## size of the 82-byte text lines of top95.txt or 1000sudoku.txt.
+
+def write_packed(grids, path):
+    "Write the grids to path as a packed puzzle file; return how many were written."
+    N = 0
+    with open(path, 'wb') as f:
+        for grid in grids:
+            f.write(pack_grid(grid))
+            N += 1
+    return N
+
+def convert(text_path, packed_path):
+    "Convert a text puzzle file (one or more lines per grid) to a packed puzzle file."
+    from sudoku_norvig import read_grids
+    return write_packed(read_grids(text_path), packed_path)
+
+def read_packed(path, block=4096):
+    """Generate the 41-byte packed grids of a packed puzzle file, reading block
+    grids at a time."""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(block*GRID_BYTES)
+            if not data:
+                return
+            assert len(data) % GRID_BYTES == 0, "%s is not a packed puzzle file" % path
+            for offset in range(0, len(data), GRID_BYTES):
+                yield data[offset:offset + GRID_BYTES]
+
+if __name__ == '__main__':
+    import sys
+    test()
+    if len(sys.argv) == 3:
+        # python sudoku_binary.py puzzles.txt puzzles.bin
+        print("Packed %d grids." % convert(sys.argv[1], sys.argv[2]))
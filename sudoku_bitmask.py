@@ -0,0 +1,241 @@
+# Voici le fichier contenant le code pour :
+# Norvig search avec les candidats représentés par des masques de bits
+# (même API que sudoku_norvig.py : parse_grid, solve_norvig, ...)
+
+
+# Code de Philippe Schoeb et Nathan Bussière
+
+import time
+
+from sudoku_norvig import GAVE_UP, make_budget
+
+## Same algorithm as sudoku_norvig.py, but the candidates of a square are stored
+## as a 9-bit integer (bit k set <=> digit k+1 still possible) in a flat list of
+## 81 slots indexed by cell number. Peers and units are precomputed as tuples of
+## cell indexes, so eliminate only does integer operations.
+
+## Throughout this program we have:
+##   i is a cell,   e.g. 0 for 'A1', 80 for 'I9'
+##   b is a bit,    e.g. 1 << 8 for digit '9'
+##   cands is a list of 81 masks, e.g. [0b111111111, 0b010000000, ...]
+
+def cross(A, B):
+    "Cross product of elements in A and elements in B."
+    return [a+b for a in A for b in B]
+
+digits   = '123456789'
+rows     = 'ABCDEFGHI'
+cols     = digits
+squares  = cross(rows, cols)
+index    = dict((s, i) for i, s in enumerate(squares))
+
+unitlist = ([cross(rows, c) for c in cols] +
+            [cross(r, cols) for r in rows] +
+            [cross(rs, cs) for rs in ('ABC','DEF','GHI') for cs in ('123','456','789')])
+units = dict((s, [u for u in unitlist if s in u])
+             for s in squares)
+peers = dict((s, set(sum(units[s],[]))-set([s]))
+             for s in squares)
+
+ALL = (1 << 9) - 1
+unit_idx = [tuple(tuple(index[s] for s in u) for u in units[s]) for s in squares]
+peer_idx = [tuple(sorted(index[s2] for s2 in peers[s])) for s in squares]
+
+## Lookup tables on the 512 possible masks
+bitcount = [bin(m).count('1') for m in range(ALL + 1)]
+bit_of   = dict((d, 1 << k) for k, d in enumerate(digits))
+mask_digits = [''.join(d for d in digits if m & bit_of[d]) for m in range(ALL + 1)]
+mask_bits = [tuple(1 << k for k in range(9) if m >> k & 1) for m in range(ALL + 1)]
+
+################ Unit Tests ################
+
+def test():
+    "A set of tests that must pass."
+    assert len(squares) == 81
+    assert len(unitlist) == 27
+    assert all(len(unit_idx[i]) == 3 for i in range(81))
+    assert all(len(peer_idx[i]) == 20 for i in range(81))
+    assert mask_digits[0b100000101] == '139'
+    assert mask_bits[0b101] == (1, 4)
+    import sudoku_norvig
+    assert values_of(parse_grid(grid1)) == sudoku_norvig.parse_grid(grid1)
+    assert values_of(parse_grid(hard1)) == sudoku_norvig.parse_grid(hard1)
+    assert solved(solve_norvig(hard1))
+    from sudoku_binary import pack_grid
+    assert parse_packed(pack_grid(hard1)) == parse_grid(hard1)
+    assert solve_norvig(hard1, max_nodes=3) is GAVE_UP
+    print('All tests pass.')
+
+################ Parse a Grid ################
+
+def parse_grid(grid):
+    """Convert grid to a list of 81 candidate masks, or
+    return False if a contradiction is detected."""
+    ## To start, every square can be any digit; then assign values from the grid.
+    cands = [ALL] * 81
+    for i, d in enumerate(grid_values(grid)):
+        if d in digits and not assign(cands, i, bit_of[d]):
+            return False ## (Fail if we can't assign d to square i.)
+    return cands
+
+def parse_packed(data):
+    """Like parse_grid, for a grid packed by sudoku_binary.pack_grid (41 bytes,
+    4 bits per square): the nibbles are assigned directly, without going
+    through a string or a dict."""
+    cands = [ALL] * 81
+    i = 0
+    for byte in data:
+        d = byte >> 4
+        if d and not assign(cands, i, 1 << (d - 1)):
+            return False
+        d = byte & 15
+        if d and i < 80 and not assign(cands, i + 1, 1 << (d - 1)):
+            return False
+        i += 2
+    return cands
+
+def grid_values(grid):
+    "Convert grid into a list of 81 chars with '0' or '.' for empties."
+    chars = [c for c in grid if c in digits or c in '0.']
+    assert len(chars) == 81
+    return chars
+
+def values_of(cands):
+    "Convert a list of masks to the {square: digits} dict used by sudoku_norvig."
+    if not cands:
+        return cands  # False or GAVE_UP
+    return dict(zip(squares, [mask_digits[m] for m in cands]))
+
+################ Constraint Propagation ################
+
+def assign(cands, i, b):
+    """Eliminate all the other values (except b) from cands[i] and propagate.
+    Return cands, except return False if a contradiction is detected."""
+    for b2 in mask_bits[cands[i] & ~b]:
+        if not eliminate(cands, i, b2):
+            return False
+    return cands
+
+def eliminate(cands, i, b):
+    """Eliminate b from cands[i]; propagate when values or places <= 2.
+    Return cands, except return False if a contradiction is detected."""
+    m = cands[i]
+    if not m & b:
+        return cands ## Already eliminated
+    m &= ~b
+    cands[i] = m
+    ## (1) If a square i is reduced to one value b2, then eliminate b2 from the peers.
+    if m == 0:
+        return False ## Contradiction: removed last value
+    elif m & (m - 1) == 0:
+        for i2 in peer_idx[i]:
+            if cands[i2] & m and not eliminate(cands, i2, m):
+                return False
+    ## (2) If a unit u is reduced to only one place for a value b, then put it there.
+    for u in unit_idx[i]:
+        place = -1
+        for i2 in u:
+            if cands[i2] & b:
+                if place >= 0:
+                    break
+                place = i2
+        else:
+            if place < 0:
+                return False ## Contradiction: no place for this value
+            # b can only be in one place in unit; assign it there
+            if not assign(cands, place, b):
+                return False
+    return cands
+
+################ Display as 2-D grid ################
+
+def display(cands):
+    "Display these values as a 2-D grid."
+    width = 1+max(bitcount[m] for m in cands)
+    line = '+'.join(['-'*(width*3)]*3)
+    for r in range(9):
+        print(''.join(mask_digits[cands[9*r+c]].center(width)+('|' if c in (2, 5) else '')
+                      for c in range(9)))
+        if r in (2, 5): print(line)
+    print()
+
+################ Search ################
+
+def solve_norvig(grid, timeout=None, max_nodes=None):
+    "Solve grid with norvig_search; see sudoku_norvig.Budget for timeout and max_nodes."
+    return values_of(norvig_search(parse_grid(grid), make_budget(timeout, max_nodes)))
+
+def solve_packed(data, timeout=None, max_nodes=None):
+    "Same as solve_norvig, for a grid packed by sudoku_binary.pack_grid."
+    return values_of(norvig_search(parse_packed(data), make_budget(timeout, max_nodes)))
+
+def norvig_search(cands, budget=None):
+    """Using depth-first search and propagation, try all possible values.
+    Return GAVE_UP if budget (a sudoku_norvig.Budget) runs out."""
+    if cands is False:
+        return False ## Failed earlier
+    if budget is not None and budget.spend():
+        return GAVE_UP
+    ## Chose the unfilled square i with the fewest possibilities
+    n, i = 10, -1
+    for i2 in range(81):
+        c = bitcount[cands[i2]]
+        if 1 < c < n:
+            n, i = c, i2
+            if c == 2:
+                break
+    if i < 0:
+        return cands ## Solved!
+    for b in mask_bits[cands[i]]:
+        result = norvig_search(assign(cands[:], i, b), budget)
+        if result or result is GAVE_UP:
+            return result
+    return False
+
+################ Utilities ################
+
+def from_file(filename, sep='\n'):
+    "Parse a file into a list of strings, separated by sep."
+    return open(filename).read().strip().split(sep)
+
+################ System test ################
+
+def solve_all(grids, name='', showif=0.0, timeout=None, max_nodes=None):
+    """Attempt to solve a sequence of grids. Report results.
+    When showif is a number of seconds, display puzzles that take longer.
+    When showif is None, don't display any puzzles.
+    timeout (seconds) and max_nodes bound the work on each grid; the grids
+    given up on are reported separately."""
+
+    def time_solve(grid):
+        start = time.time()
+        cands = norvig_search(parse_grid(grid), make_budget(timeout, max_nodes))
+        t = time.time()-start
+        ## Display puzzles that take long enough
+        if showif is not None and t > showif:
+            display(parse_grid(grid))
+            if cands: display(cands)
+            print('(%.2f seconds)\n' % t)
+        return (t, solved(values_of(cands)), cands is GAVE_UP)
+
+    times, results, gave_up = zip(*[time_solve(grid) for grid in grids])
+    N = len(grids)
+    if N >= 1:
+        print("NORVIG BITMASK")
+        print("Solved %d of %d %s puzzles (avg %.8f secs (%d Hz), max %.8f secs)." % (
+            sum(results), N, name, sum(times)/N, N/sum(times), max(times)))
+        if timeout is not None or max_nodes is not None:
+            print("Gave up on %d of %d %s puzzles (timeout or node budget)." % (sum(gave_up), N, name))
+
+def solved(values):
+    "A puzzle is solved if each unit is a permutation of the digits 1 to 9."
+    def unitsolved(unit): return set(values[s] for s in unit) == set(digits)
+    return bool(values) and all(unitsolved(unit) for unit in unitlist)
+
+grid1  = '003020600900305001001806400008102900700000008006708200002609500800203009005010300'
+hard1  = '.....6....59.....82....8....45........3........6..3.54...325..6..................'
+
+if __name__ == '__main__':
+    test()
+    solve_all(from_file("top95.txt"), "hard", None)
+    solve_all(from_file("100sudoku.txt"), "sudokus", None)
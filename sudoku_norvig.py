@@ -1,15 +1,27 @@
 # Voici le fichier contenant le code pour :
 # le numéro 1 : Norvig search
 # le numéro 2 : Random search
-# le numéro 3 : Norvig avec heuristique naked pairs
+# le numéro 3 : Norvig avec heuristique naked/hidden subsets
 # le numéro 3 : Norvig avec heuristique locked candidates (Norvig opti)
+# Norvig et random search avec une pile d'annulation (undo trail) au lieu de copies
+# Dancing links (algorithme X de Knuth) pour la couverture exacte
+# Générateur de puzzles à solution unique
+# Forme canonique des grilles et cache des solutions (en mémoire et sur disque)
 
 
 # Code de Philippe Schoeb et Nathan Bussière
 
+import collections
+import functools
+import itertools
+import multiprocessing
+import os
 import random
+import tempfile
 import time
 
+from sudoku_binary import SolutionStore
+
 ## Solve Every Sudoku Puzzle
 
 ## See http://norvig.com/sudoku.html
@@ -58,17 +70,74 @@ def test():
     assert peers['C2'] == set(['A2', 'B2', 'D2', 'E2', 'F2', 'G2', 'H2', 'I2',
                                'C1', 'C3', 'C4', 'C5', 'C6', 'C7', 'C8', 'C9',
                                'A1', 'A3', 'B1', 'B3'])
+    assert count_solutions(grid1) == 1 and is_unique(grid2) and not is_unique(hard1)
+    assert count_solutions('.'*81, 5) == 5 and not is_unique('.'*81)
+    assert count_solutions('11' + '.'*79) == 0
+    assert solved(grid_values(random_solution()))
+    puzzle = generate_puzzle(clues=30)
+    assert puzzle and is_unique(puzzle) and generate_puzzle(clues=5, tries=1) is False
+    variant = ''.join(grid1[9*c + r] for r in (3, 5, 4, 0, 1, 2, 8, 6, 7) for c in range(9))
+    variant = variant.translate(str.maketrans('123456789', '972156843'))
+    assert canonical(variant)[0] == canonical(grid1)[0]
+    assert solved(solve_cached(variant)) and solve_cached(grid1) == solve_norvig(grid1)
+    solution = solve_dlx(hard1)
+    parent = locked_c2(parse_grid(hard1))
+    s = select_mrv(parent)
+    child = assign(parent.copy(), s, solution[s])
+    assert locked_c2(child.copy(), parent) == locked_c2(child.copy())
+    solution = solve_dlx(grid2)
+    values = subsets(parse_grid(grid2))
+    assert values and all(solution[s] in values[s] for s in squares)
+    for strategies in (['xwing'], list(STRATEGIES)):
+        values = run_strategies(parse_grid(grid2), strategies)
+        assert values and all(solution[s] in values[s] for s in squares)
+    assert solved(solve_norvig_strategies(hard1))
+    assert solve_norvig(hard1, max_nodes=5) is GAVE_UP and not solved(GAVE_UP)
+    assert solve_dlx(hard1, max_nodes=5) is GAVE_UP and solve_norvig_trail(hard1, timeout=0) is GAVE_UP
+    assert list(itertools.islice(luby(1), 8)) == [1, 1, 2, 1, 1, 2, 4, 1]
+    assert solved(solve_random_restarts(grid2)) and solve_random_restarts(hard1, max_nodes=5) is GAVE_UP
+    assert restart_search(parse_grid(hard1), random_search, [1, 2]) is GAVE_UP
+    assert solve_stats(hard1, norvig_search_trail, max_nodes=5)[0] is GAVE_UP
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'grids.txt')
+        with open(path, 'w') as f:
+            f.write('# two grids\n%s\n\n%s\n' % (grid2, hard1))
+        assert list(read_grids(path)) == [grid2, hard1]
+        with open(path, 'w') as f:
+            f.write('%s\n%s\n%s\n' % (grid2, grid2[:80], hard1))
+        grids = read_grids(path)
+        assert next(grids) == grid2
+        try:
+            next(grids)
+            assert False, "a short line must raise"
+        except ValueError as e:
+            assert ':2:' in str(e)
+        with open(path, 'w') as f:
+            f.write(grid1 + '\n\n' + '\n'.join(hard1[i:i+9] for i in range(0, 81, 9)) + '\n')
+        assert list(read_grids(path, multiline=True)) == [grid1, hard1]
+        with open(path, 'w') as f:
+            f.write(grid2[:40] + '\n# cut\n' + hard1 + '\n')
+        try:
+            list(read_grids(path, multiline=True))
+            assert False, "a grid cut by a comment must raise"
+        except ValueError as e:
+            assert ':1:' in str(e)
+    random.seed(1)
+    first = solve_random_restarts(grid2, max_nodes=100)
+    random.seed(1)
+    assert solve_random_restarts(grid2, max_nodes=100) == first
     print('All tests pass.')
 
 ################ Parse a Grid ################
 
-def parse_grid(grid):
+def parse_grid(grid, stats=None):
     """Convert grid to a dict of possible values, {square: digits}, or
-    return False if a contradiction is detected."""
+    return False if a contradiction is detected. stats (a SearchStats) counts
+    the eliminations."""
     ## To start, every square can be any digit; then assign values from the grid.
     values = dict((s, digits) for s in squares)
     for s, d in grid_values(grid).items():
-        if d in digits and not assign(values, s, d):
+        if d in digits and not assign(values, s, d, None, stats):
             return False ## (Fail if we can't assign d to square s.)
     return values
 
@@ -79,27 +148,34 @@ def grid_values(grid):
     return dict(zip(squares, chars))
 
 ################ Constraint Propagation ################
-def assign(values, s, d):
+def assign(values, s, d, trail=None, stats=None):
     """Eliminate all the other values (except d) from values[s] and propagate.
     Return values, except return False if a contradiction is detected."""
     other_values = values[s].replace(d, '')
-    if all(eliminate(values, s, d2) for d2 in other_values):
+    if all(eliminate(values, s, d2, trail, stats) for d2 in other_values):
         return values
     else:
         return False
 
-def eliminate(values, s, d):
+def eliminate(values, s, d, trail=None, stats=None):
     """Eliminate d from values[s]; propagate when values or places <= 2.
-    Return values, except return False if a contradiction is detected."""
+    Return values, except return False if a contradiction is detected.
+    When trail is a list, the old (square, digits) pair is pushed on it so that
+    undo can restore the state instead of copying values before each branch.
+    When stats is a SearchStats, the elimination is counted."""
     if d not in values[s]:
         return values ## Already eliminated
+    if stats is not None:
+        stats.eliminations += 1
+    if trail is not None:
+        trail.append((s, values[s]))
     values[s] = values[s].replace(d,'')
     ## (1) If a square s is reduced to one value d2, then eliminate d2 from the peers.
     if len(values[s]) == 0:
         return False ## Contradiction: removed last value
     elif len(values[s]) == 1:
         d2 = values[s]
-        if not all(eliminate(values, s2, d2) for s2 in peers[s]):
+        if not all(eliminate(values, s2, d2, trail, stats) for s2 in peers[s]):
             return False
     ## (2) If a unit u is reduced to only one place for a value d, then put it there.
     for u in units[s]:
@@ -108,10 +184,17 @@ def eliminate(values, s, d):
             return False ## Contradiction: no place for this value
         elif len(dplaces) == 1:
             # d can only be in one place in unit; assign it there
-            if not assign(values, dplaces[0], d):
+            if not assign(values, dplaces[0], d, trail, stats):
                 return False
     return values
 
+def undo(values, trail, mark):
+    "Roll values back to the state it had when len(trail) was mark."
+    while len(trail) > mark:
+        s, old = trail.pop()
+        values[s] = old
+    return values
+
 
 ################ Display as 2-D grid ################
 # Fonction modifiée car l'ancienne ne fonctionnait pas
@@ -126,151 +209,757 @@ def display(state):
         print("")
         if r in 'CF': print(line)
 
+################ Work budget ################
+
+## Every solve_* function takes an optional timeout (seconds of wall-clock
+## time) and max_nodes (search nodes). A search that runs out of either stops
+## and returns GAVE_UP, which is false like False but tells "no answer in
+## time" apart from "no solution".
+
+class GaveUp:
+    "Type of GAVE_UP, the result of a search stopped by its budget."
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'GAVE_UP'
+
+GAVE_UP = GaveUp()
+
+class Budget:
+    """Work allowed to a search: timeout seconds from now and/or max_nodes
+    nodes (None for no limit). The search calls spend() on each node. A budget
+    with a parent also spends the parent's, e.g. one restart out of a total."""
+
+    def __init__(self, timeout=None, max_nodes=None, parent=None):
+        self.deadline = None if timeout is None else time.perf_counter() + timeout
+        self.nodes_left = max_nodes
+        self.parent = parent
+
+    def spend(self):
+        "Count a node; return True once the budget is exhausted."
+        if self.nodes_left is not None:
+            self.nodes_left -= 1
+        return self.exhausted() or (self.parent is not None and self.parent.spend())
+
+    def exhausted(self):
+        return ((self.nodes_left is not None and self.nodes_left < 0) or
+                (self.deadline is not None and time.perf_counter() > self.deadline))
+
+def make_budget(timeout=None, max_nodes=None):
+    "A Budget, or None when there is no limit (so the searches skip the checks)."
+    if timeout is None and max_nodes is None:
+        return None
+    return Budget(timeout, max_nodes)
+
 ################ Search ################
 
-def solve_norvig(grid): return norvig_search(parse_grid(grid))  # Use norvig_search
+def solve_norvig(grid, timeout=None, max_nodes=None):
+    "Solve grid with norvig_search (through the solution store when one is open)."
+    budget = make_budget(timeout, max_nodes)
+    return solve_stored(grid, lambda grid: norvig_search(parse_grid(grid), budget=budget))
+
+def solve_random(grid, timeout=None, max_nodes=None):
+    "Solve grid with random_search."
+    return random_search(parse_grid(grid), budget=make_budget(timeout, max_nodes))
+
+def solve_norvig_heuristic(grid, timeout=None, max_nodes=None):
+    "Solve grid with norvig and naked/hidden subsets."
+    return norvig_search_heuristic(parse_grid(grid), budget=make_budget(timeout, max_nodes))
+
+def solve_norvig_opti(grid, timeout=None, max_nodes=None):
+    "Solve grid with norvig and locked candidates 2."
+    return norvig_search_opti(parse_grid(grid), budget=make_budget(timeout, max_nodes))
+
+def solve_norvig_strategies(grid, timeout=None, max_nodes=None):
+    "Solve grid with norvig and every strategy."
+    return norvig_search_strategies(parse_grid(grid), budget=make_budget(timeout, max_nodes))
+
+def solve_norvig_trail(grid, timeout=None, max_nodes=None):
+    "Solve grid with norvig and an undo trail."
+    return norvig_search_trail(parse_grid(grid), budget=make_budget(timeout, max_nodes))
+
+def solve_random_trail(grid, timeout=None, max_nodes=None):
+    "Solve grid with random and an undo trail."
+    return random_search_trail(parse_grid(grid), budget=make_budget(timeout, max_nodes))
+
+def solve_random_restarts(grid, timeout=None, max_nodes=None):
+    "Solve grid with random and Luby restarts."
+    return random_search_restarts(parse_grid(grid), budget=make_budget(timeout, max_nodes))
+
+def solve_dlx(grid, timeout=None, max_nodes=None):
+    "Solve grid with dancing links (exact cover)."
+    return next(dlx_solutions(grid, make_budget(timeout, max_nodes)), False)
+
+# Locked candidates (pointing et claiming) sur les intersections carré/rangée et carré/colonne
+## For each unit u (index in unitlist), the box/line units v that cross it in 3
+## squares: (mask of those squares among the 9 of u, squares of v outside u).
+## If the places of d in u all lie in the intersection, d must be there, so it
+## is eliminated from the rest of v: a box pointing at a line, or a line
+## claiming a box.
+unit_ids = dict((s, [i for i, u in enumerate(unitlist) if s in u]) for s in squares)
+intersections = [[(sum(1 << k for k, s in enumerate(u) if s in v), [s for s in v if s not in u])
+                  for v in unitlist if len(set(u) & set(v)) == 3]
+                 for u in unitlist]
+
+def changed_units(values, parent):
+    "Indexes of the units holding a square whose candidates differ from parent (all units when parent is None)."
+    if parent is None:
+        return range(27)
+    return set(u for s in squares if values[s] is not parent[s] for u in unit_ids[s])
+
+def locked_c2(values, parent=None, stats=None):
+    """Locked candidates: pointing and claiming, propagated with eliminate.
+    Only the units whose squares changed since parent (all of them when parent
+    is None) are examined, then those changed by the eliminations, until nothing
+    changes. Return values, except return False if a contradiction is detected."""
+    dirty = changed_units(values, parent)
+    while dirty:
+        changed = []
+        for u in dirty:
+            ## places[d] is the bitmask of the squares of unit u where d is possible
+            places = dict.fromkeys(digits, 0)
+            for k, s in enumerate(unitlist[u]):
+                for d in values[s]:
+                    places[d] |= 1 << k
+            for mask, rest in intersections[u]:
+                for d in digits:
+                    if places[d] & ~mask == 0:
+                        for s in rest:
+                            if d in values[s] and not eliminate(values, s, d, changed, stats):
+                                return False
+        dirty = set(u for s, old in changed for u in unit_ids[s])
+    return values
 
-def solve_random(grid): return random_search(parse_grid(grid))  # Use random_search
 
-def solve_norvig_heuristic(grid): return norvig_search_heuristic(parse_grid(grid))  # Use norvig with naked pairs
+# Naked et hidden subsets (paires, triplets, quadruplets) sur les unités modifiées
+## mask_of maps a string of candidates (digits in order) to its 9-bit mask
+## (bit k <=> digit k+1) and mask_str does the reverse.
+mask_of = dict((''.join(d for k, d in enumerate(digits) if m >> k & 1), m) for m in range(512))
+mask_str = dict((m, ds) for ds, m in mask_of.items())
+bitcount = [bin(m).count('1') for m in range(512)]
+
+def subsets(values, parent=None, stats=None, sizes=(2, 3, 4)):
+    """Naked and hidden subsets of the given sizes, propagated with eliminate.
+    Naked: n squares of a unit whose candidates together are n digits; those
+    digits go nowhere else in the unit. Hidden: n digits that together fit in
+    only n squares of a unit; those squares can hold no other digit.
+    Like locked_c2, only the units changed since parent are examined, until
+    nothing changes. Return values, except return False if a contradiction is detected."""
+    dirty = changed_units(values, parent)
+    while dirty:
+        changed = []
+        for u in dirty:
+            unit = unitlist[u]
+            cells = [(k, mask_of[values[s]]) for k, s in enumerate(unit) if len(values[s]) > 1]
+            ## places[d] is the bitmask of the unfilled squares of unit u where d is possible
+            places = [0]*9
+            for k, m in cells:
+                for b in range(9):
+                    if m >> b & 1:
+                        places[b] |= 1 << k
+            spots = [(b, p) for b, p in enumerate(places) if p]
+            for n in sizes:
+                if n >= len(cells):
+                    break
+                ## Naked: eliminate the n digits from the other squares
+                for group in itertools.combinations([c for c in cells if bitcount[c[1]] <= n], n):
+                    ds = 0
+                    for k, m in group:
+                        ds |= m
+                    if bitcount[ds] == n:
+                        inside = [k for k, m in group]
+                        for k, m in cells:
+                            if k not in inside and m & ds:
+                                for d in mask_str[m & ds]:
+                                    if not eliminate(values, unit[k], d, changed, stats):
+                                        return False
+                ## Hidden: eliminate the other digits from the n squares
+                for group in itertools.combinations([p for p in spots if bitcount[p[1]] <= n], n):
+                    ks = ds = 0
+                    for b, p in group:
+                        ks |= p
+                        ds |= 1 << b
+                    if bitcount[ks] == n:
+                        for k in range(9):
+                            if ks >> k & 1:
+                                for d in mask_str[mask_of[values[unit[k]]] & ~ds]:
+                                    if not eliminate(values, unit[k], d, changed, stats):
+                                        return False
+        dirty = set(u for s, old in changed for u in unit_ids[s])
+    return values
 
-def solve_norvig_opti(grid): return norvig_search_opti(parse_grid(grid))  # Use norvig with locked candidates 2
 
-# array contains multiple arrays and returns array without the values present twice or more
-# array = [[1, 2, 3], [3, 4]] ---> [[1, 2], [4]]
-def remove_mult(array):
-    seen = []
-    seen_twice = []
-    for i in range(len(array)):
-        for j in range(len(array[i])):
-            if array[i][j] not in seen:
-                seen.append(array[i][j])
-            elif array[i][j] not in seen_twice:
-                seen_twice.append(array[i][j])
+# X-wing : un chiffre confiné aux deux mêmes colonnes dans deux rangées (ou l'inverse)
+def xwing(values, parent=None, stats=None):
+    """X-wing: if digit d fits in only two squares in each of two rows, in the
+    same two columns, then d is in those columns only on these two rows and is
+    eliminated from the rest of the columns (same with rows and columns swapped).
+    Digits are looked at across the whole grid, so parent is not used.
+    Return values, except return False if a contradiction is detected."""
+    changed = True
+    while changed:
+        changed = False
+        for lines, across in ((rangees, colonnes), (colonnes, rangees)):
+            for d in digits:
+                seen = {}  # mask of the 2 places of d in a line -> that line
+                for line in lines:
+                    m = 0
+                    for k, s in enumerate(line):
+                        if d in values[s]:
+                            m |= 1 << k
+                    if bitcount[m] != 2:
+                        continue
+                    if m not in seen:
+                        seen[m] = line
+                        continue
+                    for k in range(9):
+                        if m >> k & 1:
+                            for s in across[k]:
+                                if d in values[s] and s not in line and s not in seen[m]:
+                                    if not eliminate(values, s, d, None, stats):
+                                        return False
+                                    changed = True
+    return values
 
+## Propagation strategies, in the order they are usually worth trying. The
+## naked and hidden singles are always applied, by eliminate itself.
+STRATEGIES = {
+    'locked': locked_c2,
+    'subsets': subsets,
+    'xwing': xwing,
+}
+
+class SearchStats:
+    """Work done solving a puzzle: nodes expanded, backtracks (branches that
+    failed), digits eliminated, deepest choice point, and the seconds spent in
+    each phase ('parse', 'search' as timed by solve_stats) and in each
+    propagation strategy, with its number of calls."""
+
+    def __init__(self):
+        self.nodes = 0
+        self.backtracks = 0
+        self.eliminations = 0
+        self.max_depth = 0
+        self.calls = dict.fromkeys(STRATEGIES, 0)
+        self.time = dict.fromkeys(('parse', 'search') + tuple(STRATEGIES), 0.0)
+
+    def report(self):
+        "Print the counters."
+        print("%d nodes, %d backtracks, %d eliminations, max depth %d" % (
+            self.nodes, self.backtracks, self.eliminations, self.max_depth))
+        for name in self.time:
+            if self.time[name]:
+                calls = "%8d calls" % self.calls[name] if name in self.calls else " "*14
+                print("  %-8s %s %10.4f secs" % (name, calls, self.time[name]))
+
+def filled(values):
+    "True when every square of values has a single digit."
+    return all(len(values[s]) == 1 for s in squares)
+
+def run_strategies(values, strategies, parent=None, stats=None):
+    """Apply the strategies (names in STRATEGIES) to values until none of them
+    eliminates anything. Whenever one does, start again from the first one, so
+    the cheap strategies do most of the work. Each strategy is given as parent
+    the state it last left (the node's parent the first time), so it only
+    looks at what changed since. Return values or False."""
+    seen = [parent]*len(strategies)
     i = 0
-    while i < len(array):
-        j = 0
-        while j < len(array[i]):
-            if len(array[i]) <= j:
-                break
-            if array[i][j] in seen_twice:
-                array[i].remove(array[i][j])
-                continue
-            j += 1
-        i += 1
-    return array
-
-# locked candidates 2 heuristic
-def locked_c2(values):
-    for i in range(9):
-        line = colonnes[i]
-        compare_array = [[], [], []]
-        for j in range(9):
-            sq = line[j]
-            if len(values[sq]) == 1:
-                continue
-            cary = j // 3
-            for poss_val in values[sq]:
-                if poss_val not in compare_array[cary]:
-                    compare_array[cary].append(poss_val)
-
-        remaining = remove_mult(compare_array)
-        for j in range(len(remaining)):
-            for value in remaining[j]:
-                square_index = 3*j + (i // 3)
-                for s in carres[square_index]:
-                    if s not in line and len(values[s]) > 1:
-                        if len(values[s]) == 2:
-                            eliminate(values, s, value)
-                            continue
-                        values[s] = values[s].replace(value, '')
+    while i < len(strategies) and not filled(values):
+        name = strategies[i]
+        before = values.copy()
+        start = time.perf_counter()
+        values = STRATEGIES[name](values, seen[i], stats)
+        if stats is not None:
+            stats.calls[name] += 1
+            stats.time[name] += time.perf_counter() - start
+        if values is False:
+            return False
+        seen[i] = values.copy()
+        if i > 0 and any(values[s] is not before[s] for s in squares):
+            i = 0
+        else:
+            i += 1
     return values
 
+# Recherche en profondeur itérative : une pile explicite de points de choix
+# (square, chiffres restants, values sauvegardé) remplace la récursion de some(...)
+def search(values, select, strategies=(), stats=None, budget=None):
+    """Using depth-first search and propagation, try all possible values.
+    select picks the square to branch on, or returns None when values is
+    filled (so a node is scanned once, not twice); strategies is a sequence of names in
+    STRATEGIES run to fixpoint on each unsolved node (see run_strategies).
+    stats, when given, is a SearchStats that counts the work done.
+    Return the solved values, or False, or GAVE_UP when budget (a Budget) runs out."""
+    stack = []
+    parent = None
+    while True:
+        if values is not False:
+            if budget is not None and budget.spend():
+                return GAVE_UP
+            if stats is not None:
+                stats.nodes += 1
+            if strategies:
+                values = run_strategies(values, strategies, parent, stats)
+                if values is False and stats is not None:
+                    stats.backtracks += 1
+        if values is not False:
+            s = select(values)
+            if s is None:
+                return values  # Solved!
+            stack.append((s, iter(values[s]), values))
+            if stats is not None:
+                stats.max_depth = max(stats.max_depth, len(stack))
+        # Backtrack to the deepest choice point that still has a digit to try
+        values = False
+        while values is False and stack:
+            s, ds, saved = stack[-1]
+            d = next(ds, None)
+            if d is None:
+                stack.pop()
+            else:
+                values, parent = assign(saved.copy(), s, d, None, stats), saved
+                if values is False and stats is not None:
+                    stats.backtracks += 1
+        if values is False:
+            return False
 
-def norvig_search_opti(values):
-    "Using depth-first search and propagation, try all possible values with new heuristic."
-    if values is False:
-        return False  # Failed earlier
 
-    if all(len(values[s]) == 1 for s in squares):
-        return values  # Solved!
+def norvig_search_opti(values, stats=None, budget=None):
+    "Using depth-first search and propagation, try all possible values with new heuristic."
+    return search(values, select_mrv, ['locked'], stats, budget)  # New heuristic !
 
-    values = locked_c2(values)  # New heuristic !
 
-    if values is False:
-        return False
+def norvig_search_heuristic(values, stats=None, budget=None):
+    "Using depth-first search and propagation, try all possible values."
+    return search(values, select_mrv, ['subsets'], stats, budget)  # Naked et hidden subsets
 
-    if all(len(values[s]) == 1 for s in squares):
-        return values  # Solved!
 
-    # Chose the unfilled square s with the fewest possibilities
-    n, s = min((len(values[s]), s) for s in squares if len(values[s]) > 1)
-    return some(norvig_search_opti(assign(values.copy(), s, d))
-                for d in values[s])
+def norvig_search_strategies(values, strategies=tuple(STRATEGIES), stats=None, budget=None):
+    "Using depth-first search and propagation, with all (or the given) strategies at each node."
+    return search(values, select_mrv, strategies, stats, budget)
 
 
-# Une autre heuristique qu'on a essayé d'ajouter fonctionne sur tous les sudokus
-def norvig_search_heuristic(values):
+def norvig_search(values, stats=None, budget=None):
     "Using depth-first search and propagation, try all possible values."
-    if values is False:
-        return False  ## Failed earlier
-    if all(len(values[s]) == 1 for s in squares):
-        return values  ## Solved!
-
-    # Heuristique qui rajoute du temps
-    for unit in unitlist:
-        candidat_potentiels = []
-        for square in unit:
-            if (len(values[square]) == 2):
-                if (values[square] not in candidat_potentiels):
-                    candidat_potentiels.append(values[square])
-                else:
-                    for s in unit:
-                        if values[s] != values[square]:
-                            for digit in values[square]:
-
-                                if not eliminate(values.copy(), s, digit):
-                                    return False
-
-    # Chose the unfilled square s with the fewest possibilities
-    n, s = min((len(values[s]), s) for s in squares if len(values[s]) > 1)
-    return some(norvig_search_heuristic(assign(values.copy(), s, d))
-                for d in values[s])
-
-
-def norvig_search(values):
+    return search(values, select_mrv, (), stats, budget)
+
+
+def random_search(values, stats=None, budget=None, rng=random):
     "Using depth-first search and propagation, try all possible values."
+    return search(values, functools.partial(select_random, rng=rng), (), stats, budget)
+
+
+# Chose the unfilled square s with the fewest possibilities (the first one in
+# squares order on ties), or None if every square is filled. A square with 2
+# possibilities can't be beaten, so the scan stops there.
+def select_mrv(values):
+    best, n = None, 10
+    for s in squares:
+        k = len(values[s])
+        if 1 < k < n:
+            best, n = s, k
+            if k == 2:
+                break
+    return best
+
+# Chose the unfilled square s randomly (with rng, the random module or a
+# random.Random), or None if every square is filled
+def select_random(values, rng=random):
+    unfilled = [s for s in squares if len(values[s]) > 1]
+    return rng.choice(unfilled) if unfilled else None
+
+# Chose randomly among the unfilled squares with the fewest possibilities, or None
+def select_mrv_random(values, rng=random):
+    ns = [len(values[s]) for s in squares]
+    n = min((k for k in ns if k > 1), default=None)
+    return None if n is None else rng.choice([s for s, k in zip(squares, ns) if k == n])
+
+# Même recherche que norvig_search, mais sans copier values à chaque branche :
+# les éliminations sont notées dans trail et défaites au retour en arrière
+def trail_search(values, select, trail=None, stats=None, budget=None):
+    "Using depth-first search and propagation, undoing the trail on backtrack."
     if values is False:
-        return False ## Failed earlier
-    if all(len(values[s]) == 1 for s in squares):
-        return values ## Solved!
+        return False  # Failed earlier
+    if trail is None:
+        trail = []
+    stack = []
+    ok = True
+    while True:
+        if ok:
+            if budget is not None and budget.spend():
+                return GAVE_UP
+            if stats is not None:
+                stats.nodes += 1
+            s = select(values)
+            if s is None:
+                return values  # Solved!
+            stack.append((s, iter(values[s]), len(trail)))
+            if stats is not None:
+                stats.max_depth = max(stats.max_depth, len(stack))
+        # Backtrack to the deepest choice point that still has a digit to try
+        ok = False
+        while not ok and stack:
+            s, ds, mark = stack[-1]
+            undo(values, trail, mark)
+            d = next(ds, None)
+            if d is None:
+                stack.pop()
+            else:
+                ok = assign(values, s, d, trail, stats) is not False
+                if not ok and stats is not None:
+                    stats.backtracks += 1
+        if not ok:
+            return False
 
-    # Chose the unfilled square s with the fewest possibilities
-    n, s = min((len(values[s]), s) for s in squares if len(values[s]) > 1)
-    return some(norvig_search(assign(values.copy(), s, d))
-                for d in values[s])
 
+def norvig_search_trail(values, stats=None, budget=None):
+    "norvig_search using an undo trail instead of copies."
+    return trail_search(values, select_mrv, None, stats, budget)
 
-def random_search(values):
-    "Using depth-first search and propagation, try all possible values."
+
+def random_search_trail(values, stats=None, budget=None):
+    "random_search using an undo trail instead of copies."
+    return trail_search(values, select_random, None, stats, budget)
+
+
+################ Restarts ################
+
+## A randomized search has a heavy-tailed running time: most orders are quick
+## but a few get stuck in a huge subtree. Stopping it after a cutoff number of
+## nodes and starting again with a new seed bounds the tail. The cutoffs grow
+## so that a puzzle that needs a long search still gets one.
+
+def luby(base=32):
+    "Luby cutoffs: base times 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ..."
+    u, v = 1, 1
+    while True:
+        yield base*v
+        u, v = (u + 1, 1) if u & -u == v else (u, 2*v)
+
+def geometric(base=32, factor=1.5):
+    "Geometric cutoffs: base, base*factor, base*factor**2, ..."
+    cutoff = base
+    while True:
+        yield int(cutoff)
+        cutoff *= factor
+
+RESTARTS = {'luby': luby, 'geometric': geometric}
+
+def restart_search(values, search, cutoffs, stats=None, budget=None, seed=None):
+    """Run search (taking stats, budget and rng, e.g. random_search) on values
+    again and again, each time with at most the next of cutoffs nodes, until a
+    run finishes. The runs draw from one random.Random seeded with seed (or,
+    when seed is None, from the random module, so random.seed still makes the
+    whole reproducible); each run goes on where the last one stopped, so it
+    makes other choices. budget bounds the whole. Return the solved values,
+    False (a run that finishes without a solution has proved there is none), or
+    GAVE_UP (also when cutoffs runs out)."""
     if values is False:
-        return False  # Failed earlier
-    if all(len(values[s]) == 1 for s in squares):
-        return values  # Solved!
+        return False
+    rng = random.Random(random.getrandbits(64) if seed is None else seed)
+    for cutoff in cutoffs:
+        result = search(values.copy(), stats=stats, budget=Budget(max_nodes=cutoff, parent=budget), rng=rng)
+        if result is not GAVE_UP or (budget is not None and budget.exhausted()):
+            return result
+    return GAVE_UP
+
+def random_search_restarts(values, stats=None, budget=None, restarts='luby', mrv=False, seed=None):
+    """random_search restarted with the cutoffs of RESTARTS[restarts]. With mrv,
+    each run is a norvig_search that breaks MRV ties at random instead."""
+    select = select_mrv_random if mrv else select_random
+    def search_once(values, stats, budget, rng):
+        return search(values, functools.partial(select, rng=rng), (), stats, budget)
+    return restart_search(values, search_once, RESTARTS[restarts](), stats, budget, seed)
+
+
+def solve_stats(grid, search=norvig_search, timeout=None, max_nodes=None):
+    """Solve grid with search (any of the searches above) within timeout and
+    max_nodes. Return (result, stats): result is the values, False or GAVE_UP,
+    and stats the SearchStats of the work done, with the parse and search times."""
+    stats = SearchStats()
+    budget = make_budget(timeout, max_nodes)
+    start = time.perf_counter()
+    values = parse_grid(grid, stats)
+    middle = time.perf_counter()
+    values = search(values, stats=stats, budget=budget)
+    stats.time['parse'] += middle - start
+    stats.time['search'] += time.perf_counter() - middle
+    return values, stats
+
+################ Dancing Links ################
+
+## Sudoku as an exact cover problem: the 729 rows are the (square, digit) choices
+## and the 324 columns the constraints "square has a digit", "row has digit d",
+## "column has digit d" and "3x3 square has digit d". Algorithm X with dancing
+## links (Knuth) covers each column exactly once. The links are kept in flat
+## lists: node 0 is the root, nodes 1..324 the column headers, and row r owns the
+## 4 nodes 325+4r .. 328+4r.
+
+DLX_COLS = 324
+DLX_FIRST = DLX_COLS + 1
+
+def dlx_links():
+    "Build the (L, R, U, D, C, S) lists of the full sudoku exact cover matrix."
+    L = [DLX_COLS] + list(range(DLX_COLS))
+    R = list(range(1, DLX_FIRST)) + [0]
+    U = list(range(DLX_FIRST))
+    D = list(range(DLX_FIRST))
+    C = list(range(DLX_FIRST))
+    S = [0] * DLX_FIRST
+    for r in range(729):
+        cell, d = divmod(r, 9)
+        row, col = divmod(cell, 9)
+        box = (row // 3)*3 + col // 3
+        for k, c in enumerate((1 + cell, 82 + 9*row + d, 163 + 9*col + d, 244 + 9*box + d)):
+            n = DLX_FIRST + 4*r + k
+            L.append(DLX_FIRST + 4*r + (k - 1) % 4)
+            R.append(DLX_FIRST + 4*r + (k + 1) % 4)
+            U.append(U[c])
+            D.append(c)
+            C.append(c)
+            D[U[c]] = n
+            U[c] = n
+            S[c] += 1
+    return L, R, U, D, C, S
+
+dlx_template = dlx_links()
+
+def dlx_solutions(grid, budget=None):
+    """Generate every solution of grid, as {square: digit} dicts, with dancing
+    links. If budget (a Budget) runs out, GAVE_UP is generated and the search stops."""
+    L, R, U, D, C, S = [links[:] for links in dlx_template]
+
+    def cover(c):
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(c):
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        R[L[c]] = c
+        L[R[c]] = c
+
+    ## Cover the columns of the given digits; two givens sharing a column contradict
+    covered = [False] * DLX_FIRST
+    chosen = []
+    for cell, d in enumerate(grid_values(grid).values()):
+        if d in digits:
+            n = DLX_FIRST + 4*(9*cell + int(d) - 1)
+            for j in range(n, n + 4):
+                if covered[C[j]]:
+                    return
+                covered[C[j]] = True
+                cover(C[j])
+            chosen.append(n)
+
+    def search():
+        if budget is not None and budget.spend():
+            yield GAVE_UP
+            return
+        if R[0] == 0:
+            yield dict((squares[(n - DLX_FIRST) // 36], digits[(n - DLX_FIRST) // 4 % 9])
+                       for n in chosen)
+            return
+        ## Chose the column with the fewest rows left
+        c = best = R[0]
+        while c != 0:
+            if S[c] < S[best]:
+                best = c
+                if S[c] <= 1:
+                    break
+            c = R[c]
+        cover(best)
+        r = D[best]
+        while r != best:
+            chosen.append(r)
+            j = R[r]
+            while j != r:
+                cover(C[j])
+                j = R[j]
+            yield from search()
+            j = L[r]
+            while j != r:
+                uncover(C[j])
+                j = L[j]
+            chosen.pop()
+            r = D[r]
+        uncover(best)
+
+    for values in search():
+        yield values
+        if values is GAVE_UP:
+            return
+
+
+def count_solutions(grid, limit=2):
+    """Number of solutions of grid, stopping the search once limit solutions are
+    found (limit=None enumerates them all)."""
+    return sum(1 for values in itertools.islice(dlx_solutions(grid), limit))
+
+def is_unique(grid):
+    "A grid is a proper puzzle if it has exactly one solution."
+    return count_solutions(grid, 2) == 1
+
+
+################ Canonical form and cache ################
+
+## Relabelling the digits, permuting the rows inside a band, the bands, the
+## columns inside a stack, the stacks, and transposing all map a puzzle to an
+## equivalent one. canonical orders rows and columns by keys that don't change
+## under these transformations, then relabels the digits by order of first
+## appearance, so that most equivalent puzzles get the same key. (Rows or
+## columns with equal keys keep their order, so a few equivalent puzzles may
+## still get different keys: that only costs a cache miss.)
+
+def line_keys(g):
+    """Invariant keys of the rows and of the columns of the 81-char grid g: the
+    clue count of a line, refined twice with the keys of the lines crossing it
+    at a clue."""
+    clue = [[g[9*r + c] != '.' for c in range(9)] for r in range(9)]
+    rkeys = [sum(clue[r]) for r in range(9)]
+    ckeys = [sum(clue[r][c] for r in range(9)) for c in range(9)]
+    for refine in range(2):
+        rkeys, ckeys = ([(rkeys[r], sorted(ckeys[c] for c in range(9) if clue[r][c])) for r in range(9)],
+                        [(ckeys[c], sorted(rkeys[r] for r in range(9) if clue[r][c])) for c in range(9)])
+    return rkeys, ckeys
+
+def line_order(keys):
+    "Order of the 9 lines: bands sorted by their lines' keys, lines sorted inside each band."
+    bands = sorted(range(3), key=lambda b: sorted(keys[3*b:3*b+3]))
+    return [r for b in bands for r in sorted(range(3*b, 3*b+3), key=lambda r: keys[r])]
+
+def canonical(grid):
+    """Return (key, cells, relabel): key is the canonical 81-char form of grid,
+    cells[k] the index (in squares) of the square of grid that goes to position
+    k of key, and relabel the digit map from grid to key (all 9 digits)."""
+    chars = [c if c in digits else '.' for c in grid_values(grid).values()]
+    best = None
+    for transpose in (False, True):
+        index = [9*(k % 9) + k // 9 if transpose else k for k in range(81)]
+        g = [chars[i] for i in index]
+        rkeys, ckeys = line_keys(g)
+        row_order, col_order = line_order(rkeys), line_order(ckeys)
+        cells = [index[9*r + c] for r in row_order for c in col_order]
+        relabel = {}
+        for i in cells:
+            if chars[i] != '.' and chars[i] not in relabel:
+                relabel[chars[i]] = digits[len(relabel)]
+        key = ''.join(relabel.get(chars[i], '.') for i in cells)
+        if best is None or key < best[0]:
+            best = (key, cells, relabel)
+    key, cells, relabel = best
+    unused = [d for d in digits if d not in relabel.values()]
+    for d in digits:
+        if d not in relabel:
+            relabel[d] = unused.pop(0)
+    return key, cells, relabel
+
+canonical_cache = collections.OrderedDict()  # key -> solution or None, least recently used first
+CANONICAL_CACHE_SIZE = 2**16
+
+def solve_canonical(key, budget=None):
+    """Solution of the canonical puzzle key, as 81 digits, or None (cached, LRU).
+    GAVE_UP when budget runs out; that result is not cached."""
+    if key in canonical_cache:
+        canonical_cache.move_to_end(key)
+        return canonical_cache[key]
+    values = next(dlx_solutions(key, budget), False)
+    if values is GAVE_UP:
+        return GAVE_UP
+    solution = canonical_cache[key] = ''.join(values[s] for s in squares) if values else None
+    if len(canonical_cache) > CANONICAL_CACHE_SIZE:
+        canonical_cache.popitem(last=False)
+    return solution
+
+def solve_cached(grid, timeout=None, max_nodes=None):
+    """Solve grid through the canonical cache: equivalent puzzles seen before are
+    answered by mapping the cached solution back to grid."""
+    key, cells, relabel = canonical(grid)
+    solution = solve_canonical(key, make_budget(timeout, max_nodes))
+    if not solution:
+        return solution if solution is GAVE_UP else False
+    return from_canonical(solution, cells, relabel)
+
+def from_canonical(solution, cells, relabel):
+    "Map the solution of a canonical key back to the grid that canonical gave cells and relabel for."
+    inverse = dict((d2, d) for d, d2 in relabel.items())
+    return dict((squares[i], inverse[d]) for i, d in zip(cells, solution))
+
+################ Solution store ################
+
+## Solutions can also be kept on disk (see sudoku_binary.SolutionStore), keyed
+## by canonical form, so that they survive a restart. solve_norvig and
+## solve_all look puzzles up there first when a store is open.
+
+solution_store = None  # Opened with open_store
+store_busy = False     # True while solve_stored is solving, so nested calls don't look up again
+
+def open_store(path):
+    "Open (or create) the solution store at path."
+    global solution_store
+    if solution_store is not None:
+        solution_store.close()
+    solution_store = SolutionStore(path)
+    return solution_store
+
+def solve_stored(grid, solve):
+    """Return the solution of grid from the solution store, or solve it with
+    solve and add the solution to the store (unless it is read-only)."""
+    global store_busy
+    if solution_store is None or store_busy:
+        return solve(grid)
+    key, cells, relabel = canonical(grid)
+    solution = solution_store.get(key)
+    if solution is not None:
+        return from_canonical(solution, cells, relabel)
+    store_busy = True
+    try:
+        values = solve(grid)
+    finally:
+        store_busy = False
+    if solved(values) and not solution_store.readonly:
+        solution_store.put(key, ''.join(relabel[values[squares[i]]] for i in cells))
+    return values
 
-    # Chose the unfilled quare s randomly
-    count = 0
-    unfilled_s = []
-    for s in squares:
-        if len(values[s]) > 1:
-            count += 1
-            unfilled_s.append(s)
-    index = random.randrange(count)
-    s = unfilled_s[index]
+def lookup_solution(grid):
+    "Solution (81 digits) of grid from the solution store, or None."
+    if solution_store is None:
+        return None
+    key, cells, relabel = canonical(grid)
+    solution = solution_store.get(key)
+    if solution is None:
+        return None
+    values = from_canonical(solution, cells, relabel)
+    return ''.join(values[s] for s in squares)
+
+def store_solution(grid, solution):
+    "Add solution (81 digits) of grid to the solution store."
+    key, cells, relabel = canonical(grid)
+    solution_store.put(key, ''.join(relabel[solution[i]] for i in cells))
+
+# Pool initializer: the workers only read the store, the parent process writes it
+def readonly_store():
+    if solution_store is not None:
+        solution_store.readonly = True
 
-    return some(random_search(assign(values.copy(), s, d))
-                for d in values[s])
 
 ################ Utilities ################
 
@@ -284,6 +973,35 @@ def from_file(filename, sep='\n'):
     "Parse a file into a list of strings, separated by sep."
     return open(filename).read().strip().split(sep)
 
+def read_grids(filename, multiline=False):
+    """Yield the grids of a file one at a time, without loading the whole file.
+    Blank lines and '#' comments are skipped and '.' or '0' mark empties. Each
+    grid is on a line of its own; a line that does not hold 81 cells raises
+    ValueError with its line number. When multiline is true, a grid may be
+    spread over several lines instead, but not across a blank or comment line."""
+    chars, first = [], None
+    with open(filename) as f:
+        for number, line in enumerate(f, 1):
+            cells = [c for c in line.split('#', 1)[0] if c in digits or c in '0.']
+            if not multiline:
+                if cells and len(cells) != 81:
+                    raise ValueError("%s:%d: %d cells, expected 81" % (filename, number, len(cells)))
+                if cells:
+                    yield ''.join(cells)
+            elif not cells:
+                if chars:
+                    raise ValueError("%s:%d: incomplete grid" % (filename, first))
+            else:
+                if not chars:
+                    first = number
+                chars.extend(cells)
+                while len(chars) >= 81:
+                    yield ''.join(chars[:81])
+                    del chars[:81]
+                    first = number
+    if chars:
+        raise ValueError("%s:%d: incomplete grid" % (filename, first))
+
 def shuffled(seq):
     "Return a randomly shuffled copy of the input sequence."
     seq = list(seq)
@@ -292,93 +1010,145 @@ def shuffled(seq):
 
 ################ System test ################
 
-def solve_all(grids, name='', showif=0.0):
+# Solvers run by solve_all, in display order: name -> (title, solve function,
+# the search it uses when that search counts SearchStats, else None)
+SOLVERS = {
+    'norvig': ("NORVIG", solve_norvig, norvig_search),
+    'random': ("RANDOM", solve_random, random_search),
+    'subsets': ("NORVIG WITH NAKED/HIDDEN SUBSETS", solve_norvig_heuristic, norvig_search_heuristic),
+    'locked': ("NORVIG WITH LOCKED CANDIDATES 2", solve_norvig_opti, norvig_search_opti),
+    'strategies': ("NORVIG WITH ALL STRATEGIES", solve_norvig_strategies, norvig_search_strategies),
+    'trail': ("NORVIG WITH UNDO TRAIL", solve_norvig_trail, norvig_search_trail),
+    'restarts': ("RANDOM WITH LUBY RESTARTS", solve_random_restarts, random_search_restarts),
+    'dlx': ("DANCING LINKS", solve_dlx, None),
+    'cached': ("DANCING LINKS WITH CANONICAL CACHE", solve_cached, None),
+}
+
+def time_solve(solve, grid, showif=None, limits=None, search=None):
+    """Solve grid with solve, passing it the timeout and max_nodes in limits.
+    When the puzzle is displayed and search (the search used by solve) is
+    given, it is run again with solve_stats and its counters are printed.
+    Return (seconds, solved, solution string or None, gave up)."""
+    start = time.time()
+    values = solve(grid, **(limits or {}))
+    t = time.time()-start
+    ## Display puzzles that take long enough
+    if showif is not None and t > showif:
+        display(grid_values(grid))
+        if values: display(values)
+        if search is not None:
+            solve_stats(grid, search, **(limits or {}))[1].report()
+        print('(%.2f seconds)\n' % t)
+    if not solved(values):
+        return (t, False, None, values is GAVE_UP)
+    return (t, True, ''.join(values[s] for s in squares), False)
+
+# Module-level so that the worker processes can unpickle it
+def time_solve_grid(solvers, showif, limits, grid):
+    """Run every solver of solvers on grid; return grid and the list of
+    time_solve results. The grid is looked up once in the solution store: when
+    it is there, that is the result of every solver; otherwise they all search
+    (without looking it up again) and the first solution is stored."""
+    global store_busy
+    start = time.time()
+    stored = lookup_solution(grid)
+    if stored is not None:
+        return grid, [(time.time()-start, True, stored, False)]*len(solvers)
+    busy, store_busy = store_busy, True
+    try:
+        results = [time_solve(SOLVERS[solver][1], grid, showif, limits, SOLVERS[solver][2]) for solver in solvers]
+    finally:
+        store_busy = busy
+    if solution_store is not None and not solution_store.readonly and results and results[0][2]:
+        store_solution(grid, results[0][2])
+    return grid, results
+
+def solve_all(grids, name='', showif=0.0, solvers=tuple(SOLVERS), workers=1, chunksize=16, out=None,
+              store=None, timeout=None, max_nodes=None):
     """Attempt to solve a sequence of grids. Report results.
     When showif is a number of seconds, display puzzles that take longer.
-    When showif is None, don't display any puzzles."""
-
-    def time_solve_norvig(grid):
-        start = time.time()
-        values = solve_norvig(grid)
-        t = time.time()-start
-        ## Display puzzles that take long enough
-        if showif is not None and t > showif:
-            display(grid_values(grid))
-            if values: display(values)
-            print('(%.2f seconds)\n' % t)
-        return (t, solved(values))
-
-    def time_solve_random(grid):
-        start = time.time()
-        values = solve_random(grid)
-        t = time.time()-start
-        ## Display puzzles that take long enough
-        if showif is not None and t > showif:
-            display(grid_values(grid))
-            if values: display(values)
-            print('(%.2f seconds)\n' % t)
-        return (t, solved(values))
-
-    def time_solve_norvig_opti(grid):
-        start = time.time()
-        values = solve_norvig_opti(grid)
-        t = time.time()-start
-        ## Display puzzles that take long enough
-        if showif is not None and t > showif:
-            display(grid_values(grid))
-            if values: display(values)
-            print('(%.2f seconds)\n' % t)
-        return (t, solved(values))
-
-    def time_solve_norvig_heuristic(grid):
-        start = time.time()
-        values = solve_norvig_heuristic(grid)
-        t = time.time()-start
-        ## Display puzzles that take long enough
-        if showif is not None and t > showif:
-            display(grid_values(grid))
-            if values: display(values)
-            print('(%.2f seconds)\n' % t)
-        return (t, solved(values))
-
-    # Norvig
-    times, results = zip(*[time_solve_norvig(grid) for grid in grids])
-    N = len(grids)
-    if N >= 1:
-        print("NORVIG")
-        print("Solved %d of %d %s puzzles (avg %.8f secs (%d Hz), max %.8f secs)." % (
-            sum(results), N, name, sum(times)/N, N/sum(times), max(times)))
-
-    # Random
-    times, results = zip(*[time_solve_random(grid) for grid in grids])
-    N = len(grids)
-    if N >= 1:
-        print("RANDOM")
-        print("Solved %d of %d %s puzzles (avg %.8f secs (%d Hz), max %.8f secs)." % (
-            sum(results), N, name, sum(times) / N, N / sum(times), max(times)))
-
-    # Norvig naked pairs
-    times, results = zip(*[time_solve_norvig_heuristic(grid) for grid in grids])
-    N = len(grids)
-    if N > 1:
-        print("NORVIG WITH NAKED PAIRS")
-        print("Solved %d of %d %s puzzles (avg %.8f secs (%d Hz), max %.8f secs)." % (
-            sum(results), N, name, sum(times) / N, N / sum(times), max(times)))
-
-    # Norvig locked candidates
-    times, results = zip(*[time_solve_norvig_opti(grid) for grid in grids])
-    N = len(grids)
-    if N >= 1:
-        print("NORVIG WITH LOCKED CANDIDATES 2")
-        print("Solved %d of %d %s puzzles (avg %.8f secs (%d Hz), max %.8f secs)." % (
-            sum(results), N, name, sum(times) / N, N / sum(times), max(times)))
-
+    When showif is None, don't display any puzzles.
+    solvers is a sequence of keys of SOLVERS. When workers is not 1, the grids are
+    solved by a pool of that many processes (None means one per core), handed out
+    chunksize at a time; results are collected in the input order.
+    grids is consumed lazily (e.g. from read_grids) and only the running totals
+    are kept. When out is a file, the solution found by the first solver is
+    written to it as soon as each grid is done ('.'*81 when unsolved).
+    When store is a path, the solution store there is opened (or created) and
+    every grid is looked up in it before searching; it is closed at the end
+    and the store that was open before (if any) is used again.
+    timeout (seconds) and max_nodes bound the work of each solver on each grid;
+    the grids a solver gave up on are reported separately."""
+    global solution_store
+    previous = solution_store
+    if store is not None:
+        solution_store = SolutionStore(store)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pool = None if workers == 1 else multiprocessing.Pool(workers, initializer=readonly_store)
+    ## For each solver: [puzzles, solved, total secs, max secs, gave up]
+    totals = [[0, 0, 0.0, 0.0, 0] for solver in solvers]
+    limits = dict((k, v) for k, v in (('timeout', timeout), ('max_nodes', max_nodes)) if v is not None)
+    solve_grid = functools.partial(time_solve_grid, tuple(solvers), showif, limits)
+    start = time.time()
+    try:
+        if pool is None:
+            timed = map(solve_grid, grids)
+        else:
+            timed = batched_imap(pool, solve_grid, grids, chunksize, 4*workers)
+        for grid, results in timed:
+            for total, (t, ok, solution, gave_up) in zip(totals, results):
+                total[0] += 1
+                total[1] += ok
+                total[2] += t
+                total[3] = max(total[3], t)
+                total[4] += gave_up
+            if out is not None:
+                out.write((results[0][2] or '.'*81) + '\n')
+            if pool is not None and solution_store is not None and results[0][2]:
+                store_solution(grid, results[0][2])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if store is not None:
+            solution_store.close()
+            solution_store = previous
+        elif solution_store is not None:
+            solution_store.flush()
+    wall = time.time()-start
+    for solver, (N, nsolved, total, longest, gave_up) in zip(solvers, totals):
+        if N >= 1:
+            print(SOLVERS[solver][0])
+            print("Solved %d of %d %s puzzles (avg %.8f secs (%d Hz), max %.8f secs)." % (
+                nsolved, N, name, total/N, N/total, longest))
+            if limits:
+                print("Gave up on %d of %d %s puzzles (timeout or node budget)." % (gave_up, N, name))
+    if pool is not None and totals and totals[0][0] >= 1:
+        print("Wall time %.8f secs (%d Hz) on %d processes." % (wall, totals[0][0]/wall, workers))
+
+def batched_imap(pool, f, seq, chunksize, nchunks):
+    """Like pool.imap(f, seq, chunksize), but only reads seq nchunks chunks at a
+    time, so a long iterator never has to fit in memory. The next batch is
+    queued before the current one is drained, so the workers that finish early
+    go on with it instead of waiting for the slowest puzzle of the batch."""
+    seq = iter(seq)
+
+    def submit():
+        batch = list(itertools.islice(seq, chunksize*nchunks))
+        return pool.imap(f, batch, chunksize) if batch else None
+
+    current = submit()
+    while current is not None:
+        following = submit()
+        yield from current
+        current = following
 
 
 def solved(values):
     "A puzzle is solved if each unit is a permutation of the digits 1 to 9."
     def unitsolved(unit): return set(values[s] for s in unit) == set(digits)
-    return values is not False and all(unitsolved(unit) for unit in unitlist)
+    return bool(values) and all(unitsolved(unit) for unit in unitlist)
 
 def random_puzzle(N=17):
     """Make a random puzzle with N or more assignments. Restart on contradictions.
@@ -393,6 +1163,66 @@ def random_puzzle(N=17):
             return ''.join(values[s] if len(values[s])==1 else '.' for s in squares)
     return random_puzzle(N) ## Give up and make a new puzzle
 
+def random_solution():
+    "A random solved grid, as a string of 81 digits."
+    ## The three diagonal 3x3 squares don't share any unit: fill them with random
+    ## permutations, then let the randomized search complete the grid.
+    values = dict((s, digits) for s in squares)
+    for rs, cs in (('ABC', '123'), ('DEF', '456'), ('GHI', '789')):
+        for s, d in zip(cross(rs, cs), shuffled(digits)):
+            assign(values, s, d)
+    values = random_search(values)
+    return ''.join(values[s] for s in squares)
+
+def difficulty(grid):
+    """Rating of a puzzle: the number of squares still undecided after constraint
+    propagation (0 means it is solved without any search)."""
+    values = parse_grid(grid)
+    return sum(len(values[s]) > 1 for s in squares) if values else 0
+
+def generate_puzzle(clues=None, rating=None, tries=100):
+    """Make a puzzle with a unique solution, starting from a random solved grid
+    and removing clues in random order as long as the solution stays unique.
+    Stop once the puzzle has clues clues or a difficulty of at least rating
+    (whichever comes first); with neither, remove as many clues as possible.
+    Start again from a new grid (at most tries times) if the target is missed,
+    and return False if every attempt missed it."""
+    for attempt in range(tries):
+        grid = list(random_solution())
+        n = 81
+        for i in shuffled(range(81)):
+            if clues is not None and n <= clues:
+                break
+            if rating is not None and difficulty(''.join(grid)) >= rating:
+                break
+            d, grid[i] = grid[i], '.'
+            if is_unique(''.join(grid)):
+                n -= 1
+            else:
+                grid[i] = d
+        puzzle = ''.join(grid)
+        if ((clues is None or n <= clues) and
+                (rating is None or difficulty(puzzle) >= rating)):
+            return puzzle
+    return False
+
+# Module-level so that the worker processes can unpickle it
+def generate_seeded(clues, rating, seed):
+    random.seed(seed)
+    return generate_puzzle(clues, rating)
+
+def generate_puzzles(N, clues=None, rating=None, workers=None, seed=None):
+    """Generate N puzzles with generate_puzzle on a pool of workers processes
+    (None means one per core). Puzzles are yielded as soon as they are made;
+    the attempts that missed the target are skipped, so fewer than N puzzles
+    are yielded when clues or rating is hard to reach."""
+    rng = random.Random(seed)
+    seeds = [rng.randrange(2**32) for i in range(N)]
+    with multiprocessing.Pool(workers) as pool:
+        for puzzle in pool.imap_unordered(functools.partial(generate_seeded, clues, rating), seeds):
+            if puzzle:
+                yield puzzle
+
 grid1  = '003020600900305001001806400008102900700000008006708200002609500800203009005010300'
 grid2  = '4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......'
 hard1  = '.....6....59.....82....8....45........3........6..3.54...325..6..................'
@@ -401,7 +1231,7 @@ resol1 = '0000016004000800030500600010200008000000200109007000650802050790000070
 if __name__ == '__main__':
     test()
     # solve_all(resol1.strip().split('\n'), "sudoku", None)
-    solve_all(from_file("100sudoku.txt"), "sudokus", None)
+    solve_all(read_grids("100sudoku.txt"), "sudokus", None)
 
 
 ## References used: